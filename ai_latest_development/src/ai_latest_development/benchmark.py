@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+import argparse
+import contextlib
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List
+
+try:
+    from .tools.rag_tool import default_index_paths, rag_search, use_index
+except Exception:  # Allows running as a script without package context
+    from tools.rag_tool import default_index_paths, rag_search, use_index
+
+# Bump whenever a measurement changes meaning so old result files are not compared blindly
+BENCHMARK_VERSION = "1"
+SECTIONS = ("pdf", "build", "search", "crew")
+STUB_ANSWER = "Thought: I now know the final answer\nFinal Answer: Stub assessment produced for benchmarking."
+BENCH_INPUTS = {
+    'topic': 'Customer support chatbot for banking',
+    'current_year': str(datetime.now().year),
+    'region': 'EU',
+    'data_use': 'Chat transcripts with personal data; logs retained for 30 days',
+    'scenario': 'Prompt injection leading to data exfiltration',
+}
+
+
+def _project_dir() -> Path:
+    return Path(__file__).resolve().parents[2]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def _latency(seconds: List[float]) -> Dict[str, float]:
+    ms = [s * 1000 for s in seconds]
+    return {
+        "samples": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3),
+        "p50_ms": round(_percentile(ms, 50), 3),
+        "p95_ms": round(_percentile(ms, 95), 3),
+        "p99_ms": round(_percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=_project_dir(), capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+@contextlib.contextmanager
+def _scoped_env(**values: str) -> Iterator[None]:
+    previous = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+@contextlib.contextmanager
+def stub_llm(latency: float) -> Iterator[List[float]]:
+    """Replace litellm's completion calls with a canned final answer after ``latency`` seconds.
+
+    Everything above litellm (LLM client, rate limits, tracing, CrewAI) still
+    runs. Yields a list that receives one timestamp per call.
+    """
+    import litellm
+
+    calls: List[float] = []
+
+    def respond(stream: bool) -> Any:
+        calls.append(time.time())
+        if stream:
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=STUB_ANSWER))])])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=STUB_ANSWER))],
+            usage=SimpleNamespace(total_tokens=len(STUB_ANSWER) // 4),
+        )
+
+    def completion(model, messages, stream=False, **kwargs):
+        time.sleep(latency)
+        return respond(stream)
+
+    async def acompletion(model, messages, stream=False, **kwargs):
+        import asyncio
+        await asyncio.sleep(latency)
+        return respond(stream)
+
+    original = litellm.completion, litellm.acompletion
+    litellm.completion, litellm.acompletion = completion, acompletion
+    try:
+        yield calls
+    finally:
+        litellm.completion, litellm.acompletion = original
+
+
+def bench_pdf(data_dir: Path) -> Dict[str, Any]:
+    """Throughput of ``_read_pdf_text`` and ``_chunk_text`` over every PDF of the corpus."""
+    if __package__:
+        from .tools.rag_index import _chunk_text, _read_pdf_text
+    else:  # Allows running as a script without package context
+        from tools.rag_index import _chunk_text, _read_pdf_text
+
+    files = []
+    for pdf in sorted(data_dir.glob("*.pdf")):
+        started = time.perf_counter()
+        text = _read_pdf_text(pdf)
+        extract_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        chunks = _chunk_text(text)
+        chunk_seconds = time.perf_counter() - started
+        files.append({
+            "file": pdf.name,
+            "bytes": pdf.stat().st_size,
+            "chars": len(text),
+            "chunks": len(chunks),
+            "extract_seconds": round(extract_seconds, 4),
+            "chunk_seconds": round(chunk_seconds, 4),
+        })
+    extract = sum(f["extract_seconds"] for f in files)
+    chunk = sum(f["chunk_seconds"] for f in files)
+    size, chars, chunks = (sum(f[key] for f in files) for key in ("bytes", "chars", "chunks"))
+    return {
+        "files": len(files),
+        "extract_seconds": round(extract, 4),
+        "extract_mb_per_second": round(size / 1e6 / extract, 3) if extract else None,
+        "extract_chars_per_second": round(chars / extract) if extract else None,
+        "chunk_seconds": round(chunk, 4),
+        "chunks": chunks,
+        "chunks_per_second": round(chunks / chunk, 1) if chunk else None,
+        "chunk_chars_per_second": round(chars / chunk) if chunk else None,
+        "per_file": files,
+    }
+
+
+def bench_build(data_dir: Path, index_dir: Path, backend: str):
+    """Cold ``RAGIndex.build`` into an empty directory, then a no-change rebuild; returns (results, index)."""
+    if __package__:
+        from .tools.rag_index import HashingEmbeddingFunction, RAGIndex
+    else:  # Allows running as a script without package context
+        from tools.rag_index import HashingEmbeddingFunction, RAGIndex
+
+    started = time.perf_counter()
+    index = RAGIndex(data_dir, index_dir, backend=backend, embedding_fn=HashingEmbeddingFunction())
+    open_seconds = time.perf_counter() - started
+    stats = index.build()
+    started = time.perf_counter()
+    index.build()
+    noop_seconds = time.perf_counter() - started
+    stage = {
+        name: {"items": s.items, "seconds": round(s.seconds, 4), "per_second": round(s.throughput, 1)}
+        for name, s in (("extract", stats.extract), ("chunk", stats.chunk), ("embed", stats.embed), ("write", stats.write))
+    }
+    return {
+        "backend": index.store.name,
+        "embedding": index.embedding_fn.model,
+        "documents": stats.documents,
+        "chunks": index.store.count(),
+        "open_seconds": round(open_seconds, 4),
+        "wall_seconds": round(stats.wall_seconds, 4),
+        "noop_rebuild_seconds": round(noop_seconds, 4),
+        "stages": stage,
+    }, index
+
+
+def bench_search(index, queries: List[Dict[str, Any]], k: int, repeats: int) -> Dict[str, Any]:
+    """``rag_search`` latency with the query cache cleared before every call, and recall@k per search mode.
+
+    A query counts as recalled when any of its relevant source files is among
+    the top ``k`` results; MRR uses the rank of the first relevant result.
+    """
+    use_index(index)
+    seconds = []
+    for _ in range(repeats):
+        for item in queries:
+            index.query_cache.clear()
+            started = time.perf_counter()
+            output = rag_search(item["query"], k=k)
+            seconds.append(time.perf_counter() - started)
+            if output.startswith(("RAG unavailable", "RAG query failed")):
+                raise RuntimeError(output)
+    recall = {}
+    for mode in ("hybrid", "vector", "lexical"):
+        index.query_cache.clear()
+        hits, reciprocal, misses = 0, 0.0, []
+        for item in queries:
+            sources = [meta.get("source") for _, meta in index.query(item["query"], k=k, mode=mode)]
+            ranks = [i for i, source in enumerate(sources) if source in item["relevant"]]
+            if ranks:
+                hits += 1
+                reciprocal += 1 / (ranks[0] + 1)
+            else:
+                misses.append(item["query"])
+        recall[mode] = {
+            "recall_at_k": round(hits / len(queries), 4),
+            "mrr": round(reciprocal / len(queries), 4),
+            "misses": misses,
+        }
+    return {"k": k, "queries": len(queries), "rag_search": _latency(seconds), "recall": recall}
+
+
+def bench_crew(runs: int, llm_latency: float, output_dir: Path) -> Dict[str, Any]:
+    """End-to-end crew kickoffs against the stub LLM; measures orchestration overhead plus simulated model time."""
+    try:
+        if __package__:
+            from .crew import AiLatestDevelopment
+        else:  # Allows running as a script without package context
+            from crew import AiLatestDevelopment
+    except ImportError as e:
+        return {"skipped": f"crew dependencies unavailable: {e}"}
+
+    seconds, calls_per_run = [], []
+    # No response cache (stub answers must not leak into it), no background index build, no trace files
+    with _scoped_env(LLM_CACHE="0", RAG_WARMUP="0", TRACE="0", LLM_RPM="1000000"), stub_llm(llm_latency) as calls:
+        for i in range(runs):
+            crew_base = AiLatestDevelopment()
+            crew_base.report_file = str(output_dir / f"report-{i}.md")
+            before = len(calls)
+            started = time.perf_counter()
+            crew_base.crew().kickoff(inputs=dict(BENCH_INPUTS))
+            seconds.append(time.perf_counter() - started)
+            calls_per_run.append(len(calls) - before)
+    total_llm = sum(calls_per_run) * llm_latency
+    return {
+        "runs": runs,
+        "llm_latency_seconds": llm_latency,
+        "llm_calls_per_run": calls_per_run,
+        "wall": _latency(seconds),
+        # Time not explained by back-to-back stub calls; parallel tasks can push this below zero
+        "overhead_seconds_per_run": round((sum(seconds) - total_llm) / runs, 4),
+    }
+
+
+def _load_queries(path: Path) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None) -> int:
+    """
+    Offline performance benchmark: PDF extraction and chunking throughput, index
+    build time, rag_search latency and recall@k, and crew end-to-end latency.
+
+    Uses local hashing embeddings and a stub LLM, so no API key or network is
+    needed. Results are written as JSON for comparison across commits.
+    """
+    default_data_dir, _ = default_index_paths()
+    project_dir = _project_dir()
+    parser = argparse.ArgumentParser(prog="benchmark", description="Run the offline performance benchmark.")
+    parser.add_argument("--data-dir", type=Path, default=default_data_dir, help="folder with the PDF corpus")
+    parser.add_argument(
+        "--queries", type=Path, default=project_dir / "benchmarks" / "queries.jsonl",
+        help="labelled queries: one JSON object per line with 'query' and 'relevant' source files",
+    )
+    parser.add_argument("--output", type=Path, help="result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--only", default=",".join(SECTIONS), help=f"comma-separated sections to run ({', '.join(SECTIONS)})")
+    parser.add_argument("--backend", choices=("chroma", "numpy"), default=os.getenv("RAG_VECTOR_BACKEND", "chroma"))
+    parser.add_argument("--k", type=int, default=6, help="results per search and cut-off for recall@k")
+    parser.add_argument("--repeats", type=int, default=3, help="passes over the query set for latency")
+    parser.add_argument("--crew-runs", type=int, default=1, help="end-to-end crew kickoffs")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds the stub LLM waits per call")
+    args = parser.parse_args(argv)
+
+    sections = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = sorted(set(sections) - set(SECTIONS))
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(unknown)}")
+    if ("pdf" in sections or "build" in sections or "search" in sections) and not args.data_dir.is_dir():
+        print(f"Corpus folder not found: {args.data_dir}", file=sys.stderr)
+        return 1
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+
+    results: Dict[str, Any] = {
+        "benchmark_version": BENCHMARK_VERSION,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "backend": args.backend,
+            "k": args.k,
+            "repeats": args.repeats,
+            "crew_runs": args.crew_runs,
+            "llm_latency": args.llm_latency,
+            "chunk_tokens": os.getenv("RAG_CHUNK_TOKENS", "350"),
+            "parse_workers": os.getenv("RAG_PARSE_WORKERS"),
+            "search_mode": os.getenv("RAG_SEARCH_MODE", "hybrid"),
+        },
+    }
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as workdir:
+        work = Path(workdir)
+        if "pdf" in sections:
+            results["pdf"] = bench_pdf(args.data_dir)
+            print(f"pdf: {results['pdf']['extract_mb_per_second']} MB/s extract, "
+                  f"{results['pdf']['chunks_per_second']} chunks/s")
+        if "build" in sections or "search" in sections:
+            results["build"], index = bench_build(args.data_dir, work / "index", args.backend)
+            print(f"build: {results['build']['chunks']} chunks in {results['build']['wall_seconds']}s")
+            if "search" in sections:
+                results["search"] = bench_search(index, _load_queries(args.queries), args.k, args.repeats)
+                latency, recall = results["search"]["rag_search"], results["search"]["recall"]
+                print(f"search: p50 {latency['p50_ms']}ms p95 {latency['p95_ms']}ms p99 {latency['p99_ms']}ms, "
+                      + ", ".join(f"{mode} recall@{args.k} {r['recall_at_k']}" for mode, r in recall.items()))
+        if "crew" in sections:
+            results["crew"] = bench_crew(args.crew_runs, args.llm_latency, work)
+            if "wall" in results["crew"]:
+                print(f"crew: p50 {results['crew']['wall']['p50_ms']}ms per run")
+            else:
+                print(f"crew: {results['crew']['skipped']}")
+
+    output = args.output or project_dir / "benchmarks" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+import argparse
+import logging
+import os
+import sys
+import tarfile
+import time
+from pathlib import Path
+
+try:
+    from .tools.rag_tool import default_index_paths
+    from .tracing import trace_run
+except Exception:  # Allows running as a script without package context
+    from tools.rag_tool import default_index_paths
+    from tracing import trace_run
+
+
+def main(argv=None) -> int:
+    """
+    Build the RAG index ahead of time so the first rag_search does not have to.
+
+    Exits non-zero when the build fails instead of leaving a half-built index behind silently.
+    """
+    default_data_dir, default_index_dir = default_index_paths()
+    parser = argparse.ArgumentParser(prog="build-index", description="Build the AiRules RAG index.")
+    parser.add_argument("--data-dir", type=Path, default=default_data_dir, help="folder with the PDF corpus")
+    parser.add_argument("--index-dir", type=Path, default=default_index_dir, help="where the index is written")
+    parser.add_argument("--rebuild", action="store_true", help="drop the backend's vectors, manifest and BM25 index first (caches are kept)")
+    parser.add_argument("--archive", type=Path, help="also pack the finished index into this .tar.gz")
+    parser.add_argument(
+        "--backend", choices=("chroma", "numpy"), default=os.getenv("RAG_VECTOR_BACKEND", "chroma"),
+        help="vector store to build (default: RAG_VECTOR_BACKEND or chroma)",
+    )
+    parser.add_argument(
+        "--import-from", choices=("chroma", "numpy"),
+        help="copy vectors from this backend of the same index instead of re-embedding, then sync with the corpus",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if not args.data_dir.is_dir():
+        print(f"Corpus folder not found: {args.data_dir}", file=sys.stderr)
+        return 1
+    if args.rebuild and args.import_from:
+        print("--import-from already replaces the store; drop --rebuild", file=sys.stderr)
+        return 2
+    args.index_dir.mkdir(parents=True, exist_ok=True)
+
+    # Imported here so --help and argument errors stay fast
+    if __package__:
+        from .tools.rag_index import RAGIndex
+    else:  # Allows running as a script without package context
+        from tools.rag_index import RAGIndex
+
+    started = time.perf_counter()
+    with trace_run("run", "build-index", run_id=time.strftime("build-%Y%m%d-%H%M%S"), backend=args.backend):
+        index = RAGIndex(data_dir=args.data_dir, index_dir=args.index_dir, backend=args.backend)
+        if args.rebuild:
+            index.clear()
+        if args.import_from:
+            copied = index.import_from(args.import_from)
+            print(f"Imported {copied} chunks from the {args.import_from} store")
+        stats = index.build()
+    print(stats.summary())
+    print(
+        f"Index ready: {index.store.count()} chunks from {len(index.manifest.entries)} documents "
+        f"in {args.index_dir} ({time.perf_counter() - started:.1f}s)"
+    )
+
+    if args.archive:
+        args.archive.parent.mkdir(parents=True, exist_ok=True)
+        with tarfile.open(args.archive, "w:gz") as tar:
+            tar.add(
+                args.index_dir,
+                arcname=args.index_dir.name,
+                filter=lambda info: None if info.name.endswith(".tmp") else info,
+            )
+        print(f"Archived index to {args.archive}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
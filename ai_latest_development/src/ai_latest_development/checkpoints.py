@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from crewai.tasks.task_output import TaskOutput
+
+try:
+    from .tracing import incr
+except Exception:  # Allows running as a script without package context
+    from tracing import incr
+
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every stored checkpoint, e.g. when the prompt assembly changes
+CHECKPOINT_VERSION = "1"
+
+
+def _default_dir() -> Path:
+    return Path(__file__).resolve().parents[2] / "knowledge" / "checkpoints"
+
+
+class CheckpointStore:
+    """Task outputs stored as one JSON file per checkpoint key."""
+
+    def __init__(self, directory: Path | None = None):
+        self.directory = directory or Path(os.getenv("CREW_CHECKPOINT_DIR", str(_default_dir())))
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)["raw"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, task_name: str, raw: str) -> None:
+        path = self._path(key)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"task": task_name, "raw": raw, "created": time.time()}, f)
+        os.replace(tmp, path)
+
+
+def _upstream(tasks: List[Any], index: int) -> List[Any]:
+    """Tasks whose output feeds ``tasks[index]``, mirroring CrewAI's sequential process.
+
+    An explicit ``context`` wins. Otherwise an async task only sees the last
+    synchronous task before it and a synchronous task sees everything before it.
+    """
+    task = tasks[index]
+    if isinstance(task.context, list):
+        return task.context
+    earlier = tasks[:index]
+    if task.async_execution:
+        sync = [t for t in earlier if not t.async_execution]
+        return sync[-1:]
+    return earlier
+
+
+def _plain(value: Any) -> Any:
+    """YAML config as plain data.
+
+    CrewBase replaces ``agent``/``context`` names in the loaded config with the
+    Agent and Task objects, whose reprs carry per-instance ids; map them back
+    to names so keys are stable across runs.
+    """
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return getattr(value, "name", None) or getattr(value, "role", None) or type(value).__name__
+
+
+def task_spec(crew_base: Any, task: Any) -> Dict[str, Any]:
+    """The task's and its agent's YAML config plus the model.
+
+    Must be taken before kickoff, which interpolates inputs into descriptions and roles.
+    """
+    role = getattr(task.agent, "role", None)
+    agent_config = next((cfg for cfg in crew_base.agents_config.values() if cfg.get("role") == role), role)
+    return {
+        "task": _plain(crew_base.tasks_config.get(task.name, task.description)),
+        "agent": _plain(agent_config),
+        "model": getattr(getattr(task.agent, "llm", None), "model", None),
+    }
+
+
+def task_key(spec: Dict[str, Any], inputs: Dict[str, Any], upstream_outputs: List[str]) -> str:
+    """Hash of the task spec, the inputs it references and the upstream outputs.
+
+    Only inputs that appear as ``{placeholder}`` in the task or agent config
+    count, so e.g. changing ``region`` leaves tasks that never mention it cached.
+    """
+    spec_text = json.dumps(spec, sort_keys=True, default=str)
+    used = {name: value for name, value in inputs.items() if "{" + name + "}" in spec_text}
+    payload = {"version": CHECKPOINT_VERSION, "spec": spec, "inputs": used, "upstream": upstream_outputs}
+    encoded = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _write_output_file(task: Any, raw: str) -> None:
+    if task.output_file:
+        path = Path(task.output_file)
+        if path.parent != Path("."):
+            path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(raw, encoding="utf-8")
+
+
+def kickoff_with_checkpoints(crew_base: Any, inputs: Dict[str, Any], store: CheckpointStore | None = None) -> str:
+    """Run the crew, reusing stored outputs of tasks whose key has not changed.
+
+    A task is restored only when all of its upstream tasks were restored too, so
+    its key can be computed from their actual outputs before the run. Restored
+    tasks are dropped from the crew and their outputs attached to the task
+    objects, where dependent tasks pick them up as context. The others store
+    their output as they finish. Returns the raw output of the last task.
+    """
+    store = store or CheckpointStore()
+    crew = crew_base.crew()
+    tasks = list(crew.tasks)
+    specs = [task_spec(crew_base, task) for task in tasks]
+    restored: Dict[int, str] = {}
+    for i, task in enumerate(tasks):
+        upstream = _upstream(tasks, i)
+        if any(tasks.index(u) not in restored for u in upstream):
+            continue
+        key = task_key(specs[i], inputs, [restored[tasks.index(u)] for u in upstream])
+        raw = store.get(key)
+        if raw is None:
+            continue
+        restored[i] = raw
+        task.output = TaskOutput(description=task.description, raw=raw, agent=getattr(task.agent, "role", ""))
+        _write_output_file(task, raw)
+        logger.info("Reusing checkpoint for task %s", task.name)
+
+    incr("restored_tasks", len(restored))
+    pending = [task for i, task in enumerate(tasks) if i not in restored]
+    if not pending:
+        return restored[len(tasks) - 1]
+    for i, task in enumerate(tasks):
+        upstream = _upstream(tasks, i)
+        implicit = not isinstance(task.context, list)
+        if i not in restored and implicit and any(tasks.index(u) in restored for u in upstream):
+            # Restored tasks no longer run, so implicit context has to be made explicit
+            task.context = upstream
+    for i, task in enumerate(tasks):
+        if i not in restored:
+            task.callback = _checkpointing(store, tasks, i, specs[i], inputs, task.callback)
+    crew.tasks = pending
+    return crew.kickoff(inputs=inputs).raw
+
+
+def _checkpointing(
+    store: CheckpointStore,
+    tasks: List[Any],
+    index: int,
+    spec: Dict[str, Any],
+    inputs: Dict[str, Any],
+    callback: Callable[[TaskOutput], Any] | None,
+) -> Callable[[TaskOutput], Any]:
+    """Task callback storing the output as soon as the task finishes, then calling ``callback``.
+
+    Tasks that finished are kept even if a later task fails. Upstream tasks
+    always finish first, so their outputs are already attached.
+    """
+    task = tasks[index]
+
+    def on_done(output: TaskOutput) -> Any:
+        upstream = [u.output.raw for u in _upstream(tasks, index) if u.output is not None]
+        try:
+            store.put(task_key(spec, inputs, upstream), task.name, output.raw)
+        except OSError as e:
+            logger.warning("Could not store checkpoint for task %s: %s", task.name, e)
+        if callback is not None:
+            return callback(output)
+
+    return on_done
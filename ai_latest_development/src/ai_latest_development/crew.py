@@ -1,37 +1,142 @@
 from crewai import Agent, Crew, Process, Task
-from crewai.project import CrewBase, agent, crew, task
+from crewai.project import CrewBase, agent, crew, llm, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
+from crewai.llms.base_llm import BaseLLM
+import asyncio
 from typing import List
 import os
-import litellm
 try:
-    from .tools import RagSearchTool
+    from .llm_cache import cache_key, get_response_cache
+    from .llm_client import get_llm_client
+    from .streaming import TokenSink
+    from .tools import RagBatchSearchTool, RagSearchTool, start_index_warmup
+    from .tracing import Tracer, activate, current_tracer, span
 except Exception:  # Allows running as a script without package context
-    from tools import RagSearchTool
+    from llm_cache import cache_key, get_response_cache
+    from llm_client import get_llm_client
+    from streaming import TokenSink
+    from tools import RagBatchSearchTool, RagSearchTool, start_index_warmup
+    from tracing import Tracer, activate, current_tracer, span
 
 # If you want to run a snippet of code before or after the crew starts,
 # you can use the @before_kickoff and @after_kickoff decorators
 # https://docs.crewai.com/concepts/crews#example-crew-class-with-decorators
 
-class GeminiLLM:
-    """Custom Gemini LLM wrapper for CrewAI"""
-    
-    def __init__(self, model="gemini/gemini-2.0-flash-lite-001", api_key=None):
-        self.model = model
+def _task_label(task):
+    """Short display name of a Task or TaskOutput for traces"""
+    return getattr(task, "name", None) or (getattr(task, "description", None) or "task")[:60]
+
+
+def _trace_task_start(tracer, task, agent):
+    """Open the trace span of ``task`` on its first LLM call (CrewAI has no task-start hook)"""
+    if tracer is not None and task is not None:
+        tracer.begin_task(getattr(task, "description", None) or _task_label(task), _task_label(task), agent)
+    return _task_label(task) if task is not None else None
+
+
+class GeminiLLM(BaseLLM):
+    """Gemini LLM for CrewAI agents
+
+    Calls go through the process-wide LLM client, so every agent and every
+    concurrent crew run shares one connection pool, rate limit and retry policy.
+    Subclassing BaseLLM makes CrewAI use this object as-is; anything else is
+    replaced by a plain litellm-backed ``crewai.LLM`` that bypasses the client.
+    """
+
+    # Input limit of the Gemini 2.0 Flash models, in tokens
+    CONTEXT_WINDOW = 1_048_576
+
+    def __init__(self, model="gemini/gemini-2.0-flash-lite-001", api_key=None, temperature=None):
+        super().__init__(model=model, temperature=temperature)
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
-        
-    def call(self, prompt, **kwargs):
-        """Call the Gemini API using litellm"""
-        try:
-            response = litellm.completion(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                api_key=self.api_key,
-                **kwargs
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            raise Exception(f"Error calling Gemini API: {e}")
+        # Per-run settings, kept on the object rather than in context variables because
+        # CrewAI runs async_execution tasks on threads that do not inherit the caller's context
+        self.refresh_cache = False
+        self.token_sink: TokenSink | None = None
+        self.tracer: Tracer | None = None
+
+    def supports_function_calling(self) -> bool:
+        # Agents use CrewAI's ReAct text format, so tools are never sent as function schemas
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return True
+
+    def get_context_window_size(self) -> int:
+        # Keep the same 15% headroom as crewai.LLM
+        return int(self.CONTEXT_WINDOW * 0.85)
+
+    def _request(self, messages):
+        messages = messages if isinstance(messages, list) else [{"role": "user", "content": messages}]
+        kwargs = {}
+        # CrewAgentExecutor sets stop words (e.g. "\nObservation:") so the model halts before inventing tool output
+        if self.stop:
+            kwargs["stop"] = list(self.stop)
+        if self.temperature is not None:
+            kwargs["temperature"] = self.temperature
+        return messages, kwargs
+
+    def _cached(self, messages, kwargs):
+        """Return (cache, key, cached response) for this request; cache is None when disabled
+
+        With ``refresh_cache`` set, cached responses are ignored but fresh ones are still stored.
+        """
+        cache = get_response_cache()
+        if cache is None:
+            return None, None, None
+        key = cache_key(self.model, messages, kwargs)
+        return cache, key, None if self.refresh_cache else cache.get(key)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        """Call the Gemini API through the shared LLM client
+
+        With a ``token_sink`` set the completion is streamed and every delta is
+        passed to the sink, with the calling agent's role, as it arrives.
+        """
+        agent = getattr(from_agent, "role", None)
+        task = _trace_task_start(self.tracer, from_task, agent)
+        messages, kwargs = self._request(messages)
+        sink = self.token_sink
+        with activate(self.tracer), span("llm", self.model, agent=agent, task=task, streamed=sink is not None) as trace:
+            cache, key, content = self._cached(messages, kwargs)
+            if content is not None:
+                trace.set(cache_hits=1)
+                if sink is not None:
+                    sink(content, agent)
+                return content
+            try:
+                if sink is not None:
+                    content = get_llm_client().stream_completion(
+                        self.model, messages, lambda text: sink(text, agent), api_key=self.api_key, **kwargs
+                    )
+                else:
+                    response = get_llm_client().completion(self.model, messages, api_key=self.api_key, **kwargs)
+                    content = response.choices[0].message.content
+            except Exception as e:
+                raise Exception(f"Error calling Gemini API: {e}")
+            if cache is not None and content:
+                cache.put(key, content)
+            return content
+
+    async def acall(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None):
+        """Async counterpart of ``call``"""
+        agent = getattr(from_agent, "role", None)
+        task = _trace_task_start(self.tracer, from_task, agent)
+        messages, kwargs = self._request(messages)
+        with activate(self.tracer), span("llm", self.model, agent=agent, task=task, streamed=False) as trace:
+            cache, key, content = await asyncio.to_thread(self._cached, messages, kwargs)
+            if content is not None:
+                trace.set(cache_hits=1)
+                return content
+            try:
+                response = await get_llm_client().acompletion(self.model, messages, api_key=self.api_key, **kwargs)
+                content = response.choices[0].message.content
+            except Exception as e:
+                raise Exception(f"Error calling Gemini API: {e}")
+            if cache is not None and content:
+                await asyncio.to_thread(cache.put, key, content)
+            return content
+
 
 @CrewBase
 class AiLatestDevelopment():
@@ -40,6 +145,24 @@ class AiLatestDevelopment():
     agents: List[BaseAgent]
     tasks: List[Task]
 
+    # Set per instance before crew() to keep concurrent runs from sharing one report
+    report_file: str = 'report.md'
+    # Ignore cached LLM responses for this run while still storing the fresh ones
+    refresh_llm_cache: bool = False
+    # Receives streamed LLM output as (text, agent role), e.g. to show it live in the UI
+    token_sink = None
+    # Trace of the current run, taken from tracing.trace_run when crew() is called
+    tracer = None
+    # Optional per-run hooks, e.g. to surface progress in the UI
+    step_callback = None
+    task_callback = None
+
+    # One LLM object per crew instance: CrewAI writes each agent's stop words onto
+    # it. The connection pool, rate limits and retries live in the shared LLM client.
+    @llm
+    def gemini(self) -> GeminiLLM:
+        return GeminiLLM(api_key=os.getenv("GEMINI_API_KEY"))
+
     # Learn more about YAML configuration files here:
     # Agents: https://docs.crewai.com/concepts/agents#yaml-configuration-recommended
     # Tasks: https://docs.crewai.com/concepts/tasks#yaml-configuration-recommended
@@ -48,54 +171,42 @@ class AiLatestDevelopment():
     # https://docs.crewai.com/concepts/agents#agent-tools
     @agent
     def ai_risk_assessment_analyst(self) -> Agent:
-        llm = GeminiLLM(
-            model="gemini/gemini-2.0-flash-lite-001",
-            api_key=os.getenv("GEMINI_API_KEY")
-        )
         return Agent(
             config=self.agents_config['ai_risk_assessment_analyst'], # type: ignore[index]
-            llm=llm,
+            llm=self.gemini(),
             verbose=True
         )
 
     @agent
     def ai_compliance_researcher(self) -> Agent:
-        llm = GeminiLLM(
-            model="gemini/gemini-2.0-flash-lite-001",
-            api_key=os.getenv("GEMINI_API_KEY")
-        )
         return Agent(
             config=self.agents_config['ai_compliance_researcher'], # type: ignore[index]
-            llm=llm,
-            tools=[RagSearchTool()],
+            llm=self.gemini(),
+            tools=self._rag_tools(),
             verbose=True
         )
 
     @agent
     def data_privacy_security_specialist(self) -> Agent:
-        llm = GeminiLLM(
-            model="gemini/gemini-2.0-flash-lite-001",
-            api_key=os.getenv("GEMINI_API_KEY")
-        )
         return Agent(
             config=self.agents_config['data_privacy_security_specialist'], # type: ignore[index]
-            llm=llm,
-            tools=[RagSearchTool()],
+            llm=self.gemini(),
+            tools=self._rag_tools(),
             verbose=True
         )
 
     @agent
     def risk_report_generator(self) -> Agent:
-        llm = GeminiLLM(
-            model="gemini/gemini-2.0-flash-lite-001",
-            api_key=os.getenv("GEMINI_API_KEY")
-        )
         return Agent(
             config=self.agents_config['risk_report_generator'], # type: ignore[index]
-            llm=llm,
+            llm=self.gemini(),
             verbose=True
         )
 
+    def _rag_tools(self):
+        # Tools look up the run's tracer when called, since the crew is built before the run starts
+        return [RagSearchTool(tracer_source=lambda: self.tracer), RagBatchSearchTool(tracer_source=lambda: self.tracer)]
+
     # To learn more about structured task outputs,
     # task dependencies, and task callbacks, check out the documentation:
     # https://docs.crewai.com/concepts/tasks#overview-of-a-task
@@ -121,7 +232,7 @@ class AiLatestDevelopment():
     def risk_report_task(self) -> Task:
         return Task(
             config=self.tasks_config['risk_report_task'], # type: ignore[index]
-            output_file='report.md'
+            output_file=self.report_file
         )
 
     @crew
@@ -130,9 +241,38 @@ class AiLatestDevelopment():
         # To learn how to add knowledge sources to your crew, check out the documentation:
         # https://docs.crewai.com/concepts/knowledge#what-is-knowledge
 
+        # Task dependencies live in tasks.yaml: independent analyses are marked
+        # async_execution and the report declares them as its context, so the
+        # sequential process fans them out and joins before the report.
+        # CREW_PARALLEL=0 restores strictly one-after-another execution.
+        if os.getenv("CREW_PARALLEL", "1") == "0":
+            for t in self.tasks:
+                t.async_execution = False
+
+        # Per-run settings go on the crew's LLM object: CrewAI runs async_execution
+        # tasks on fresh threads, so context variables set by the caller are not seen there
+        self.tracer = self.tracer or current_tracer()
+        gemini = self.gemini()
+        gemini.refresh_cache = self.refresh_llm_cache
+        gemini.token_sink = self.token_sink
+        gemini.tracer = self.tracer
+
+        # Open/build the RAG index in the background while the first agents start thinking
+        if os.getenv("RAG_WARMUP", "1") != "0":
+            start_index_warmup()
+
         return Crew(
             agents=self.agents,
             tasks=self.tasks,
             process=Process.sequential,
             verbose=True,
+            step_callback=self.step_callback,
+            task_callback=self._on_task_done,
         )
+
+    def _on_task_done(self, output):
+        """Close the task's trace span, then pass the output on to ``task_callback``"""
+        if self.tracer is not None:
+            self.tracer.end_task(getattr(output, "description", None) or _task_label(output))
+        if self.task_callback is not None:
+            self.task_callback(output)
@@ -0,0 +1,99 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+try:
+    from .streaming import RunTranscript
+    from .tracing import Tracer, trace_run
+except Exception:  # Allows running as a script without package context
+    from streaming import RunTranscript
+    from tracing import Tracer, trace_run
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+@dataclass
+class Job:
+    """One assessment: its inputs, status, live transcript, trace and final report."""
+
+    id: str
+    inputs: Dict[str, Any]
+    status: str = QUEUED
+    transcript: RunTranscript = field(default_factory=RunTranscript)
+    trace: Tracer | None = None
+    report: str | None = None
+    error: str | None = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+
+class JobManager:
+    """Bounded worker pool running crew jobs off the Streamlit script thread.
+
+    ``crew_factory`` builds a fresh crew object per job, so concurrent jobs never
+    share task state; each job gets its own report file and transcript. The LLM
+    client and RAG index stay process-wide singletons shared by all jobs.
+    """
+
+    def __init__(self, crew_factory: Callable[[], Any], max_workers: int | None = None, report_dir: str = "reports/ui"):
+        self.crew_factory = crew_factory
+        self.report_dir = report_dir
+        workers = max_workers or int(os.getenv("UI_MAX_CONCURRENT_RUNS", "2"))
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="crew-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, inputs: Dict[str, Any]) -> str:
+        """Queue an assessment and return its job id immediately."""
+        job = Job(id=uuid.uuid4().hex[:12], inputs=dict(inputs))
+        with self._lock:
+            self._jobs[job.id] = job
+        # A fresh context per job keeps the run tracers of jobs sharing a worker thread apart
+        self._pool.submit(contextvars.Context().run, self._execute, job)
+        return job.id
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def forget(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.active:
+                del self._jobs[job_id]
+
+    def _execute(self, job: Job) -> None:
+        job.status, job.started_at = RUNNING, time.time()
+        try:
+            crew_base = self.crew_factory()
+            crew_base.report_file = f"{self.report_dir}/{job.id}.md"
+            crew_base.step_callback = job.transcript.on_step
+            crew_base.task_callback = job.transcript.on_task
+            crew_base.token_sink = job.transcript.on_token
+            with trace_run('run', 'crew', run_id=f"ui-{job.id}") as tracer:
+                job.trace = tracer
+                result = crew_base.crew().kickoff(inputs=job.inputs)
+            job.report = getattr(result, "raw", None) or str(result)
+            job.status = DONE
+        except Exception as e:
+            logger.exception("Job %s failed", job.id)
+            job.error, job.status = str(e), FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def jobs(self, ids: List[str]) -> List[Job]:
+        with self._lock:
+            return [self._jobs[i] for i in ids if i in self._jobs]
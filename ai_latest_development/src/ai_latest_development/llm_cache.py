@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Per-call transport settings that do not change the generated text
+_NON_SEMANTIC_KWARGS = {"api_key", "timeout", "stream", "metadata"}
+
+
+def cache_key(model: str, messages: List[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+    """Stable hash of the model, the messages and the generation kwargs."""
+    params = {k: v for k, v in kwargs.items() if k not in _NON_SEMANTIC_KWARGS}
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SqliteResponseCache:
+    """LLM responses in one SQLite file, least recently used evicted beyond ``max_entries``."""
+
+    def __init__(self, path: Path, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " content TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return row[0]
+
+    def put(self, key: str, content: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, last_used) VALUES (?, ?, ?)",
+                (key, content, time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+            self._conn.commit()
+
+
+class FileResponseCache:
+    """One JSON file per response; file mtimes double as the LRU clock."""
+
+    def __init__(self, directory: Path, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                content = json.load(f)["content"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return content
+
+    def put(self, key: str, content: str) -> None:
+        path = self._path(key)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"content": content}, f)
+        os.replace(tmp, path)
+        with self._lock:
+            entries = list(self.directory.glob("*.json"))
+            excess = len(entries) - self.max_entries
+            if excess > 0:
+                for old in sorted(entries, key=lambda p: p.stat().st_mtime)[:excess]:
+                    old.unlink(missing_ok=True)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the cache selected by ``LLM_CACHE`` (``sqlite``/``file``), or None when disabled."""
+    global _default_cache
+    backend = os.getenv("LLM_CACHE", "0").lower()
+    if backend not in ("sqlite", "file"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            default_dir = Path(__file__).resolve().parents[2] / "knowledge" / "llm_cache"
+            directory = Path(os.getenv("LLM_CACHE_DIR", str(default_dir)))
+            max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+            if backend == "sqlite":
+                _default_cache = SqliteResponseCache(directory / "responses.sqlite3", max_entries)
+            else:
+                _default_cache = FileResponseCache(directory, max_entries)
+        return _default_cache
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import litellm
+
+try:
+    import httpx
+except Exception:  # pragma: no cover
+    httpx = None
+
+try:
+    from .tracing import incr
+except Exception:  # Allows running as a script without package context
+    from tracing import incr
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``per_minute / 60`` units per second.
+
+    ``reserve`` debits immediately (the balance may go negative) and returns how
+    long the caller has to wait, so the same bucket serves sync and async callers.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            # Never ask for more than a full bucket, or a huge prompt could wait forever
+            self._level -= min(amount, self.capacity)
+            return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def refund(self, amount: float) -> None:
+        with self._lock:
+            self._level = min(self.capacity, self._level + amount)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit with additive increase on success and multiplicative decrease on 429s."""
+
+    def __init__(self, initial: int, maximum: int):
+        self.maximum = max(1, maximum)
+        self.limit = float(max(1, min(initial, self.maximum)))
+        self._active = 0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self._active < int(self.limit):
+                self._active += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._active >= int(self.limit):
+                self._cond.wait()
+            self._active += 1
+
+    async def aacquire(self) -> None:
+        delay = 0.01
+        while not self.try_acquire():
+            await asyncio.sleep(delay)
+            delay = min(0.25, delay * 2)
+
+    def release(self, throttled: bool = False) -> None:
+        with self._cond:
+            self._active -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+def _is_rate_limited(exc: Exception) -> bool:
+    if isinstance(exc, getattr(litellm, "RateLimitError", ())):
+        return True
+    return getattr(exc, "status_code", None) == 429 or "429" in str(exc)
+
+
+def _is_transient(exc: Exception) -> bool:
+    transient = tuple(
+        cls for cls in (
+            getattr(litellm, "Timeout", None),
+            getattr(litellm, "APIConnectionError", None),
+            getattr(litellm, "ServiceUnavailableError", None),
+            getattr(litellm, "InternalServerError", None),
+        ) if cls is not None
+    )
+    return isinstance(exc, transient) or getattr(exc, "status_code", None) in (500, 502, 503, 504)
+
+
+def _text_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for rate budgeting
+    return len(text) // 4
+
+
+def _estimate_tokens(messages: List[Dict[str, Any]], max_tokens: int | None) -> int:
+    return sum(_text_tokens(str(m.get("content", ""))) for m in messages) + (max_tokens or 1024)
+
+
+def _usage(response: Any) -> int | None:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+class LLMClient:
+    """Process-wide LLM gateway shared by every agent and every concurrent crew run.
+
+    All completions go through one pooled HTTP client, a requests-per-minute and a
+    tokens-per-minute token bucket, and an adaptive concurrency limit that starts
+    at ``initial_concurrency``, halves on 429 responses and grows back towards
+    ``max_concurrency`` as calls succeed. Rate-limited and transient failures are
+    retried with jittered exponential backoff; every call carries a timeout.
+
+    Every attempt, retries included, is charged to the requests-per-minute bucket,
+    since each one is a real API request. The token estimate is reserved once per
+    logical request and refunded if the request finally fails.
+    """
+
+    def __init__(
+        self,
+        rpm: int | None = None,
+        tpm: int | None = None,
+        max_concurrency: int | None = None,
+        timeout: float | None = None,
+        max_retries: int | None = None,
+        initial_concurrency: int | None = None,
+    ):
+        self.requests = TokenBucket(rpm or int(os.getenv("LLM_RPM", "30")))
+        self.tokens = TokenBucket(tpm or int(os.getenv("LLM_TPM", "1000000")))
+        concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        initial = initial_concurrency or int(os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+        self.limiter = AdaptiveLimiter(initial=initial, maximum=concurrency)
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", "120"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "5"))
+        self._configure_pool(concurrency)
+
+    @staticmethod
+    def _configure_pool(concurrency: int) -> None:
+        if httpx is None:
+            return
+        limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+        if getattr(litellm, "client_session", None) is None:
+            litellm.client_session = httpx.Client(limits=limits)
+        if getattr(litellm, "aclient_session", None) is None:
+            litellm.aclient_session = httpx.AsyncClient(limits=limits)
+
+    def _reserve(self, estimate: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(estimate))
+
+    def _settle(self, used: Any, estimate: int) -> None:
+        if isinstance(used, int):
+            incr("tokens", used)
+            if used < estimate:
+                self.tokens.refund(estimate - used)
+            else:
+                self.tokens.reserve(used - estimate)
+
+    def _backoff(self, attempt: int) -> float:
+        return min(60.0, 2.0 ** attempt) * (0.5 + random.random() / 2)
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Backoff before a retry, or longer if the retry has to wait for the requests-per-minute budget."""
+        return max(self._backoff(attempt), self.requests.reserve(1))
+
+    def _should_retry(self, exc: Exception, attempt: int) -> bool:
+        return attempt < self.max_retries and (_is_rate_limited(exc) or _is_transient(exc))
+
+    def _run(self, estimate: int, fn: Callable[[], Tuple[Any, int | None]], can_retry: Callable[[], bool]) -> Any:
+        """Run ``fn`` under the rate limits and retry policy; ``fn`` returns (result, tokens used)."""
+        attempt = 0
+        time.sleep(self._reserve(estimate))
+        while True:
+            self.limiter.acquire()
+            throttled = False
+            try:
+                result, used = fn()
+            except Exception as e:
+                throttled = _is_rate_limited(e)
+                if not can_retry() or not self._should_retry(e, attempt):
+                    self.tokens.refund(estimate)
+                    raise
+                logger.warning("LLM call failed (attempt %d), retrying: %s", attempt + 1, e)
+                incr("retries")
+            else:
+                self._settle(used, estimate)
+                return result
+            finally:
+                self.limiter.release(throttled=throttled)
+            time.sleep(self._retry_delay(attempt))
+            attempt += 1
+
+    def completion(self, model: str, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+        kwargs.setdefault("timeout", self.timeout)
+
+        def call():
+            response = litellm.completion(model=model, messages=messages, **kwargs)
+            return response, _usage(response)
+
+        return self._run(_estimate_tokens(messages, kwargs.get("max_tokens")), call, lambda: True)
+
+    def stream_completion(
+        self, model: str, messages: List[Dict[str, Any]], on_token: Callable[[str], None], **kwargs: Any
+    ) -> str:
+        """Stream a completion, passing each text delta to ``on_token``; returns the full text.
+
+        A failed stream is only retried if nothing has been emitted yet.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        parts: List[str] = []
+
+        def call():
+            for chunk in litellm.completion(model=model, messages=messages, stream=True, **kwargs):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    on_token(delta)
+            text = "".join(parts)
+            prompt = sum(_text_tokens(str(m.get("content", ""))) for m in messages)
+            return text, prompt + _text_tokens(text)
+
+        return self._run(_estimate_tokens(messages, kwargs.get("max_tokens")), call, lambda: not parts)
+
+    async def acompletion(self, model: str, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+        kwargs.setdefault("timeout", self.timeout)
+        estimate = _estimate_tokens(messages, kwargs.get("max_tokens"))
+        attempt = 0
+        await asyncio.sleep(self._reserve(estimate))
+        while True:
+            await self.limiter.aacquire()
+            throttled = False
+            try:
+                response = await litellm.acompletion(model=model, messages=messages, **kwargs)
+            except Exception as e:
+                throttled = _is_rate_limited(e)
+                if not self._should_retry(e, attempt):
+                    self.tokens.refund(estimate)
+                    raise
+                logger.warning("LLM call failed (attempt %d), retrying: %s", attempt + 1, e)
+                incr("retries")
+            else:
+                self._settle(_usage(response), estimate)
+                return response
+            finally:
+                self.limiter.release(throttled=throttled)
+            await asyncio.sleep(self._retry_delay(attempt))
+            attempt += 1
+
+
+_client: LLMClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide LLM client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
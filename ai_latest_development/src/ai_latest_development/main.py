@@ -7,7 +7,20 @@ from dotenv import load_dotenv
 
 from datetime import datetime
 
-from crew import AiLatestDevelopment
+import contextvars
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from .checkpoints import kickoff_with_checkpoints
+    from .crew import AiLatestDevelopment
+    from .tracing import trace_run
+except Exception:  # Allows running as a script without package context
+    from checkpoints import kickoff_with_checkpoints
+    from crew import AiLatestDevelopment
+    from tracing import trace_run
 
 # Load environment variables from .env file
 env_path = Path(__file__).parent.parent.parent / '.env'
@@ -20,61 +33,158 @@ warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 # Replace with inputs you want to test with, it will automatically
 # interpolate any tasks and agents information
 
-def run():
-    """
-    Run the crew.
-    """
-    inputs = {
+def _inputs():
+    return {
         'topic': 'AI LLMs',
         'current_year': str(datetime.now().year),
         'region': os.getenv('REGION', 'EU'),
         'data_use': os.getenv('DATA_USE', 'Personal data, user prompts, model logs'),
         'scenario': os.getenv('SCENARIO', 'Prompt injection leading to data exfiltration')
     }
-    
+
+def _kickoff(inputs, report_file=None, run_id=None):
+    crew_base = AiLatestDevelopment()
+    if report_file:
+        crew_base.report_file = report_file
+    # LLM_CACHE_REFRESH=1 re-asks every prompt for this run and refreshes the cached responses
+    crew_base.refresh_llm_cache = os.getenv('LLM_CACHE_REFRESH') == '1'
+    run_id = run_id or datetime.now().strftime('run-%Y%m%d-%H%M%S')
+    with trace_run('run', 'crew', run_id=run_id, topic=inputs.get('topic')):
+        if os.getenv('CREW_CHECKPOINTS', '1') == '0':
+            crew_base.crew().kickoff(inputs=inputs)
+        else:
+            kickoff_with_checkpoints(crew_base, inputs)
+
+def run():
+    """
+    Run the crew.
+
+    Task outputs are checkpointed, so a re-run only recomputes the tasks whose
+    inputs, YAML config or upstream outputs changed. CREW_CHECKPOINTS=0 always
+    runs every task. A trace of the run is written to TRACE_DIR (see tracing.py).
+    """
     try:
-        AiLatestDevelopment().crew().kickoff(inputs=inputs)
+        _kickoff(_inputs())
     except Exception as e:
         raise Exception(f"An error occurred while running the crew: {e}")
-run()
-
-
-
-# def train():
-#     """
-#     Train the crew for a given number of iterations.
-#     """
-#     inputs = {
-#         "topic": "AI LLMs",
-#         'current_year': str(datetime.now().year)
-#     }
-#     try:
-#         AiLatestDevelopment().crew().train(n_iterations=int(sys.argv[1]), filename=sys.argv[2], inputs=inputs)
-
-#     except Exception as e:
-#         raise Exception(f"An error occurred while training the crew: {e}")
-
-# def replay():
-#     """
-#     Replay the crew execution from a specific task.
-#     """
-#     try:
-#         AiLatestDevelopment().crew().replay(task_id=sys.argv[1])
-
-#     except Exception as e:
-#         raise Exception(f"An error occurred while replaying the crew: {e}")
-
-# def test():
-#     """
-#     Test the crew execution and returns the results.
-#     """
-#     inputs = {
-#         "topic": "AI LLMs",
-#         "current_year": str(datetime.now().year)
-#     }
-    
-#     try:
-#         AiLatestDevelopment().crew().test(n_iterations=int(sys.argv[1]), eval_llm=sys.argv[2], inputs=inputs)
-
-#     except Exception as e:
-#         raise Exception(f"An error occurred while testing the crew: {e}")
+
+
+BATCH_FIELDS = ('topic', 'region', 'data_use', 'scenario')
+
+def _record_id(record):
+    if record.get('id'):
+        return str(record['id'])
+    payload = json.dumps({k: record.get(k) for k in BATCH_FIELDS}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+def _load_batch_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def run_batch():
+    """
+    Run one assessment per record of a JSONL file.
+
+    Usage: run_batch <records.jsonl> [output_dir]
+
+    Each line holds topic/region/data_use/scenario (missing fields fall back to
+    the single-run defaults) and an optional id. Reports are written to
+    <output_dir>/<id>.md (default output_dir: BATCH_OUTPUT_DIR or "reports").
+    Up to BATCH_CONCURRENCY crews (default 2) run at once; they share the RAG
+    index and the rate-limited LLM client. Progress is kept in
+    <output_dir>/batch_state.json, so re-running the same command skips
+    finished records. Failed records rerun only the tasks that had not finished,
+    since every finished task is checkpointed (unless CREW_CHECKPOINTS=0).
+    """
+    if len(sys.argv) < 2:
+        raise Exception("Usage: run_batch <records.jsonl> [output_dir]")
+    records_path = Path(sys.argv[1])
+    output_dir = Path(sys.argv[2] if len(sys.argv) > 2 else os.getenv('BATCH_OUTPUT_DIR', 'reports'))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    state_path = output_dir / 'batch_state.json'
+    state = _load_batch_state(state_path)
+    state_lock = threading.Lock()
+
+    records = []
+    with open(records_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+
+    def save_state(record_id, entry):
+        with state_lock:
+            state[record_id] = entry
+            tmp = state_path.with_name(state_path.name + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp, state_path)
+
+    def assess(record_id, record):
+        inputs = {**_inputs(), **{k: str(record[k]) for k in BATCH_FIELDS if record.get(k)}}
+        report_file = str(output_dir / f"{record_id}.md")
+        try:
+            _kickoff(inputs, report_file=report_file, run_id=f"batch-{record_id}")
+        except Exception as e:
+            save_state(record_id, {'status': 'failed', 'error': str(e)})
+            return False
+        save_state(record_id, {'status': 'done', 'report': report_file})
+        return True
+
+    pending = []
+    for record in records:
+        record_id = _record_id(record)
+        if state.get(record_id, {}).get('status') == 'done' and (output_dir / f"{record_id}.md").exists():
+            continue
+        pending.append((record_id, record))
+
+    workers = max(1, int(os.getenv('BATCH_CONCURRENCY', '2')))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Each record runs in a copy of this context so per-run settings stay isolated
+        futures = [
+            pool.submit(contextvars.copy_context().run, assess, record_id, record)
+            for record_id, record in pending
+        ]
+        failed = sum(1 for future in as_completed(futures) if not future.result())
+
+    print(f"Batch finished: {len(records) - len(pending)} skipped, "
+          f"{len(pending) - failed} completed, {failed} failed. State: {state_path}")
+    if failed:
+        raise Exception(f"{failed} of {len(pending)} batch records failed; re-run to resume")
+
+
+def train():
+    """
+    Train the crew for a given number of iterations.
+    """
+    try:
+        AiLatestDevelopment().crew().train(n_iterations=int(sys.argv[1]), filename=sys.argv[2], inputs=_inputs())
+
+    except Exception as e:
+        raise Exception(f"An error occurred while training the crew: {e}")
+
+def replay():
+    """
+    Replay the crew execution from a specific task.
+    """
+    try:
+        AiLatestDevelopment().crew().replay(task_id=sys.argv[1])
+
+    except Exception as e:
+        raise Exception(f"An error occurred while replaying the crew: {e}")
+
+def test():
+    """
+    Test the crew execution and returns the results.
+    """
+    try:
+        AiLatestDevelopment().crew().test(n_iterations=int(sys.argv[1]), eval_llm=sys.argv[2], inputs=_inputs())
+
+    except Exception as e:
+        raise Exception(f"An error occurred while testing the crew: {e}")
+
+
+if __name__ == "__main__":
+    run()
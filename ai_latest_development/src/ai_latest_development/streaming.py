@@ -0,0 +1,50 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Receives (text delta, agent role) as GeminiLLM streams a completion
+TokenSink = Callable[[str, Optional[str]], None]
+
+
+def _describe_step(step: Any) -> str:
+    """One line for a CrewAI AgentAction/AgentFinish (or list of tool results)."""
+    if isinstance(step, list):
+        return "; ".join(_describe_step(s) for s in step)
+    tool = getattr(step, "tool", None)
+    if tool:
+        return f"Using {tool}: {str(getattr(step, 'tool_input', ''))[:200]}"
+    thought = getattr(step, "thought", None) or getattr(step, "text", None) or getattr(step, "result", None)
+    return str(thought if thought is not None else step)[:300]
+
+
+class RunTranscript:
+    """Thread-safe, accumulated progress of one crew run.
+
+    The LLM sink and the crew's step/task callbacks run on CrewAI's worker
+    threads; readers take a ``snapshot`` at any time, as often as they like.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live: Dict[str, str] = {}
+        self._steps: List[str] = []
+        self._finished: List[Tuple[str, str]] = []
+
+    def on_token(self, text: str, agent: Optional[str] = None) -> None:
+        with self._lock:
+            key = agent or "Agent"
+            self._live[key] = self._live.get(key, "") + text
+
+    def on_step(self, step: Any) -> None:
+        with self._lock:
+            self._steps.append(_describe_step(step))
+
+    def on_task(self, output: Any) -> None:
+        agent = getattr(output, "agent", None) or "Agent"
+        with self._lock:
+            self._live.pop(agent, None)
+            self._finished.append((agent, getattr(output, "raw", str(output))))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """``live`` partial output per agent, ``steps`` and ``finished`` (agent, output) pairs."""
+        with self._lock:
+            return {"live": dict(self._live), "steps": list(self._steps), "finished": list(self._finished)}
@@ -1,2 +1,12 @@
-from .rag_tool import rag_search, RagSearchTool
-
+from .rag_tool import (
+    arag_search,
+    arag_search_batch,
+    default_index_paths,
+    index_status,
+    rag_search,
+    rag_search_batch,
+    start_index_warmup,
+    use_index,
+    RagBatchSearchTool,
+    RagSearchTool,
+)
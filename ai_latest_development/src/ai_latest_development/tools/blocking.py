@@ -0,0 +1,20 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def run_blocking(fn, *args):
+    """Run a blocking call (Chroma, SQLite, index build) in the bounded retrieval executor."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_ASYNC_WORKERS", "8")), thread_name_prefix="rag"
+        )
+    return asyncio.get_running_loop().run_in_executor(_executor, partial(fn, *args))
+
+
+def query_timeout(timeout: float | None) -> float:
+    return timeout if timeout is not None else float(os.getenv("RAG_QUERY_TIMEOUT", "30"))
@@ -0,0 +1,123 @@
+import gzip
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    from .jurisdiction import matches_where
+except Exception:  # Allows running as a script without package context
+    from jurisdiction import matches_where
+
+# Keeps dotted clause numbers ("1.1", "6.1.2") together as one token
+_TERM_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+_IDENTIFIER_RE = re.compile(r"^(\d+(\.\d+)*[a-z]?|[ivxlcdm]+)$")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms plus joined ``<word> <number>`` terms.
+
+    The joined terms make regulatory identifiers such as "Article 52",
+    "Annex III" or "GOVERN 1.1" match as a unit rather than as two common words.
+    """
+    terms = _TERM_RE.findall(text.lower())
+    joined = [
+        f"{a} {b}"
+        for a, b in zip(terms, terms[1:])
+        if not _IDENTIFIER_RE.match(a) and _IDENTIFIER_RE.match(b)
+    ]
+    return terms + joined
+
+
+class BM25Index:
+    """In-process Okapi BM25 inverted index over the chunks in the vector store.
+
+    Chunks are persisted as gzip-compressed JSON next to the vector store files and
+    the postings are rebuilt in memory on load.
+    """
+
+    def __init__(self, path: Path, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.documents: Dict[str, Tuple[str, dict]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def load(self) -> None:
+        self.documents, self._lengths, self._postings, self._total_length = {}, {}, {}, 0
+        if not self.path.exists():
+            return
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return
+        for chunk_id, (text, meta) in payload.get("documents", {}).items():
+            self._index(chunk_id, text, meta)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump({"documents": self.documents}, f)
+        os.replace(tmp, self.path)
+
+    def _index(self, chunk_id: str, text: str, meta: dict) -> None:
+        if chunk_id in self.documents:
+            self._unindex(chunk_id)
+        counts = Counter(tokenize(text))
+        self.documents[chunk_id] = (text, meta)
+        self._lengths[chunk_id] = sum(counts.values())
+        self._total_length += self._lengths[chunk_id]
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[chunk_id] = tf
+
+    def _unindex(self, chunk_id: str) -> None:
+        text, _ = self.documents.pop(chunk_id)
+        self._total_length -= self._lengths.pop(chunk_id, 0)
+        for term in set(tokenize(text)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(chunk_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def add(self, ids: Iterable[str], documents: Iterable[str], metadatas: Iterable[dict]) -> None:
+        for chunk_id, text, meta in zip(ids, documents, metadatas):
+            self._index(chunk_id, text, meta)
+
+    def remove_source(self, source: str) -> None:
+        for chunk_id in [cid for cid, (_, meta) in self.documents.items() if meta.get("source") == source]:
+            self._unindex(chunk_id)
+
+    def query(self, question: str, k: int = 6, where: dict | None = None) -> List[Tuple[str, str, dict, float]]:
+        """Return up to ``k`` (id, document, metadata, score) tuples, best first.
+
+        ``where`` restricts results using Chroma's metadata filter syntax.
+        """
+        n = len(self.documents)
+        if n == 0:
+            return []
+        avg_length = self._total_length / n
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(question)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                if where and not matches_where(self.documents[chunk_id][1], where):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(cid, self.documents[cid][0], self.documents[cid][1], score) for cid, score in best]
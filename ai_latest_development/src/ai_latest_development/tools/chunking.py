@@ -0,0 +1,228 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Set, Tuple
+
+# Words and individual punctuation marks; a close, dependency-free proxy for subword token counts
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"\w+")
+_SENTENCE_RE = re.compile(r"(?<=[.;:!?])\s+")
+
+# Headings used across the AiRules corpus: AI Act articles/annexes/chapters, NIST function
+# categories ("GOVERN 1.1") and numbered clauses (ISO 42001 "6.1.2 Actions to address risks")
+_HEADING_RE = re.compile(
+    r"^("
+    r"(?i:article|annex|chapter|section|title|part|principle)\s+[\dIVXLCDM]+[a-z]?(\s*$|\s+[A-Z\-\u2013\u2014:])"
+    r"|(GOVERN|MAP|MEASURE|MANAGE)\s+\d+(\.\d+)*\b"
+    r"|\d+(\.\d+){1,3}\.?\s+[A-Z][^.;,]{2,80}$"
+    r")"
+)
+
+
+def count_tokens(text: str) -> int:
+    return len(_TOKEN_RE.findall(text))
+
+
+def _is_heading(line: str) -> bool:
+    line = line.strip()
+    if not line or len(line) > 80:
+        return False
+    if _HEADING_RE.match(line):
+        return True
+    # Short all-caps titles such as "GENERAL PROVISIONS"
+    return line.isupper() and len(_WORD_RE.findall(line)) >= 2
+
+
+@dataclass
+class Chunk:
+    text: str
+    page_start: int
+    page_end: int
+    section: str
+    tokens: int
+
+
+@dataclass
+class _Block:
+    text: str
+    page: int
+    tokens: int
+    heading: bool
+
+
+def _iter_blocks(pages: List[str], max_tokens: int) -> Iterator[_Block]:
+    """Split pages into paragraphs, headings and (for oversized paragraphs) sentence windows."""
+    for page_no, page in enumerate(pages, 1):
+        paragraph: List[str] = []
+
+        def flush() -> Iterator[_Block]:
+            if not paragraph:
+                return
+            text = " ".join(paragraph).strip()
+            paragraph.clear()
+            if not text:
+                return
+            tokens = count_tokens(text)
+            if tokens <= max_tokens:
+                yield _Block(text, page_no, tokens, False)
+                return
+            for piece in _split_oversized(text, max_tokens):
+                yield _Block(piece, page_no, count_tokens(piece), False)
+
+        for line in page.splitlines():
+            if not line.strip():
+                yield from flush()
+            elif _is_heading(line):
+                yield from flush()
+                yield _Block(line.strip(), page_no, count_tokens(line), True)
+            else:
+                paragraph.append(line.strip())
+        yield from flush()
+
+
+def _split_oversized(text: str, max_tokens: int) -> Iterator[str]:
+    current: List[str] = []
+    current_tokens = 0
+    for sentence in _SENTENCE_RE.split(text):
+        tokens = count_tokens(sentence)
+        if tokens > max_tokens:
+            # A single run-on "sentence" (tables, lists): fall back to word windows
+            if current:
+                yield " ".join(current)
+                current, current_tokens = [], 0
+            words = sentence.split()
+            step = max(1, int(max_tokens * 0.75))
+            for i in range(0, len(words), step):
+                yield " ".join(words[i:i + step])
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            yield " ".join(current)
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        yield " ".join(current)
+
+
+def chunk_pages(
+    pages: List[str],
+    max_tokens: int = 350,
+    overlap_tokens: int = 60,
+    min_tokens: int = 80,
+) -> Iterator[Chunk]:
+    """Pack paragraphs into chunks of at most ``max_tokens`` (plus any leading headings).
+
+    A heading always starts a new chunk and a page break does so once the
+    current chunk holds ``min_tokens``, so chunks follow the document structure.
+    When a chunk is split for size, up to ``overlap_tokens`` of its trailing
+    paragraphs are repeated at the start of the next one.
+    """
+    blocks: List[_Block] = []
+    tokens = 0
+    section = ""
+
+    def has_body() -> bool:
+        return any(not b.heading for b in blocks)
+
+    def emit() -> Chunk:
+        return Chunk(
+            text="\n\n".join(b.text for b in blocks),
+            page_start=blocks[0].page,
+            page_end=blocks[-1].page,
+            section=section,
+            tokens=tokens,
+        )
+
+    def carry_over() -> Tuple[List[_Block], int]:
+        kept: List[_Block] = []
+        kept_tokens = 0
+        for b in reversed(blocks):
+            if b.heading or kept_tokens + b.tokens > overlap_tokens:
+                break
+            kept.insert(0, b)
+            kept_tokens += b.tokens
+        return kept, kept_tokens
+
+    for block in _iter_blocks(pages, max_tokens):
+        if block.heading:
+            if has_body():
+                yield emit()
+                blocks, tokens = [], 0
+            # Consecutive headings ("CHAPTER III" + "HIGH-RISK AI SYSTEMS") form one section label
+            section = (f"{section} / {block.text}" if blocks else block.text)[:200]
+        elif has_body() and tokens + block.tokens > max_tokens:
+            yield emit()
+            blocks, tokens = carry_over()
+        elif has_body() and block.page != blocks[-1].page and tokens >= min_tokens:
+            yield emit()
+            blocks, tokens = [], 0
+        blocks.append(block)
+        tokens += block.tokens
+    if has_body():
+        yield emit()
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """64-bit SimHash over word shingles; near-identical texts differ in only a few bits."""
+    words = [w.lower() for w in _WORD_RE.findall(text)]
+    if not words:
+        return 0
+    shingles = [" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))]
+    weights = [0] * 64
+    for s in shingles:
+        h = int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    value = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            value |= 1 << bit
+    return value
+
+
+class NearDuplicateIndex:
+    """Detects chunks within ``max_distance`` Hamming bits of an already indexed SimHash.
+
+    The 64-bit hash is split into ``max_distance + 1`` bands; by pigeonhole any
+    near-duplicate shares at least one band exactly, so only those candidates are compared.
+    Each hash may carry an owner (its source file) so callers can tell which
+    document a duplicate was found in.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self._band_bits = 64 // self.bands
+        self._buckets: List[Dict[int, Set[int]]] = [{} for _ in range(self.bands)]
+        self._owners: Dict[int, str | None] = {}
+
+    def _keys(self, value: int) -> List[int]:
+        mask = (1 << self._band_bits) - 1
+        return [(value >> (i * self._band_bits)) & mask for i in range(self.bands)]
+
+    def _match(self, value: int) -> int | None:
+        for bucket, key in zip(self._buckets, self._keys(value)):
+            for other in bucket.get(key, ()):
+                if bin(value ^ other).count("1") <= self.max_distance:
+                    return other
+        return None
+
+    def contains(self, value: int) -> bool:
+        return self._match(value) is not None
+
+    def owner_of(self, value: int) -> str | None:
+        """Owner of an indexed near-duplicate of ``value``, or None if there is none (or it has no owner)."""
+        match = self._match(value)
+        return self._owners.get(match) if match is not None else None
+
+    def add(self, value: int, owner: str | None = None) -> None:
+        for bucket, key in zip(self._buckets, self._keys(value)):
+            bucket.setdefault(key, set()).add(value)
+        self._owners.setdefault(value, owner)
+
+    def add_if_new(self, value: int, owner: str | None = None) -> bool:
+        """Record ``value`` and return True unless it is a near-duplicate of an indexed hash."""
+        if self.contains(value):
+            return False
+        self.add(value, owner)
+        return True
@@ -0,0 +1,171 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Set, Tuple
+
+try:
+    from .chunking import count_tokens
+except Exception:  # Allows running as a script without package context
+    from chunking import count_tokens
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass
+class Passage:
+    """A packed snippet: one chunk or several adjacent chunks of the same source."""
+
+    text: str
+    source: str
+    page_start: int | None
+    page_end: int | None
+    chunks: List[int] = field(default_factory=list)
+
+    @property
+    def citation(self) -> str:
+        if not self.page_start:
+            return self.source
+        if self.page_start == self.page_end:
+            return f"{self.source}, p. {self.page_start}"
+        return f"{self.source}, pp. {self.page_start}-{self.page_end}"
+
+
+def _terms(text: str) -> Set[str]:
+    return {w.lower() for w in _WORD_RE.findall(text)}
+
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def mmr_select(
+    candidates: List[Tuple[str, dict]],
+    k: int,
+    lambda_mult: float = 0.7,
+    duplicate_threshold: float = 0.9,
+) -> List[Tuple[str, dict]]:
+    """Pick ``k`` candidates by maximal marginal relevance.
+
+    ``candidates`` are ordered best first, so relevance is taken from the rank.
+    Redundancy is the word-set Jaccard similarity to already selected
+    candidates, which needs no extra embedding calls. Candidates at least
+    ``duplicate_threshold`` similar to a selected one are dropped outright.
+    """
+    if len(candidates) <= 1:
+        return candidates[:k]
+    n = len(candidates)
+    relevance = [1.0 - i / n for i in range(n)]
+    terms = [_terms(doc) for doc, _ in candidates]
+    selected: List[int] = []
+    remaining = list(range(n))
+    while remaining and len(selected) < k:
+        best = max(
+            remaining,
+            key=lambda i: lambda_mult * relevance[i]
+            - (1 - lambda_mult) * max((_similarity(terms[i], terms[j]) for j in selected), default=0.0),
+        )
+        selected.append(best)
+        remaining = [
+            i for i in remaining
+            if i != best and _similarity(terms[i], terms[best]) < duplicate_threshold
+        ]
+    return [candidates[i] for i in selected]
+
+
+def _merge_text(first: str, second: str) -> str:
+    """Concatenate adjacent chunks, dropping paragraphs repeated by the chunk overlap."""
+    head = first.split("\n\n")
+    tail = second.split("\n\n")
+    for size in range(min(len(head), len(tail)), 0, -1):
+        if head[-size:] == tail[:size]:
+            tail = tail[size:]
+            break
+    return "\n\n".join(head + tail)
+
+
+def _to_passage(doc: str, meta: dict) -> Passage:
+    meta = meta if isinstance(meta, dict) else {}
+    chunk = meta.get("chunk")
+    return Passage(
+        text=doc.strip(),
+        source=meta.get("source", "unknown"),
+        page_start=meta.get("page_start"),
+        page_end=meta.get("page_end", meta.get("page_start")),
+        chunks=[chunk] if isinstance(chunk, int) else [],
+    )
+
+
+def merge_adjacent(passages: List[Passage]) -> List[Passage]:
+    """Merge passages whose chunks are consecutive in the same source, keeping the earliest position."""
+    merged: List[Passage] = []
+    for passage in passages:
+        target = next(
+            (
+                p for p in merged
+                if p.source == passage.source and p.chunks and passage.chunks
+                and (passage.chunks[0] == p.chunks[-1] + 1 or passage.chunks[-1] == p.chunks[0] - 1)
+            ),
+            None,
+        )
+        if target is None:
+            merged.append(passage)
+            continue
+        if passage.chunks[0] == target.chunks[-1] + 1:
+            target.text = _merge_text(target.text, passage.text)
+            target.chunks = target.chunks + passage.chunks
+        else:
+            target.text = _merge_text(passage.text, target.text)
+            target.chunks = passage.chunks + target.chunks
+        pages = [p for p in (target.page_start, target.page_end, passage.page_start, passage.page_end) if p]
+        if pages:
+            target.page_start, target.page_end = min(pages), max(pages)
+    return merged
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to roughly ``max_tokens``, keeping whole paragraphs and then whole words."""
+    kept: List[str] = []
+    used = 0
+    for paragraph in text.split("\n\n"):
+        tokens = count_tokens(paragraph)
+        if used + tokens <= max_tokens:
+            kept.append(paragraph)
+            used += tokens
+            continue
+        words: List[str] = []
+        for word in paragraph.split():
+            used += count_tokens(word)
+            if used > max_tokens:
+                break
+            words.append(word)
+        if words:
+            kept.append(" ".join(words) + " ...")
+        break
+    return "\n\n".join(kept)
+
+
+def pack_context(
+    candidates: List[Tuple[str, dict]],
+    k: int,
+    token_budget: int,
+    lambda_mult: float = 0.7,
+) -> List[Passage]:
+    """Turn over-fetched retrieval candidates into at most ``k`` diverse passages within ``token_budget``."""
+    selected = mmr_select(candidates, k, lambda_mult)
+    passages = merge_adjacent([_to_passage(doc, meta) for doc, meta in selected])
+    packed: List[Passage] = []
+    remaining = token_budget
+    for passage in passages:
+        if remaining <= 0:
+            break
+        tokens = count_tokens(passage.text)
+        if tokens > remaining:
+            # Only worth truncating when a meaningful part of the passage fits
+            if remaining < 50 and packed:
+                break
+            passage.text = _truncate(passage.text, remaining)
+            tokens = count_tokens(passage.text)
+        packed.append(passage)
+        remaining -= tokens
+    return packed
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    from chromadb.utils import embedding_functions
+    _EmbeddingFunctionBase = embedding_functions.EmbeddingFunction
+except Exception:  # pragma: no cover - the NumPy vector backend works without chromadb
+    _EmbeddingFunctionBase = object
+
+try:
+    from ..tracing import span
+except Exception:  # Allows running as a script without package context
+    from tracing import span
+
+
+def _text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent embedding store keyed by model name and text hash.
+
+    Vectors are stored as float32 blobs in SQLite. Entries carry a last-used
+    timestamp and the least recently used ones are evicted once the cache grows
+    beyond ``max_entries``.
+    """
+
+    def __init__(self, path: Path, max_entries: int | None = None):
+        self.path = path
+        self.max_entries = max_entries or int(os.getenv("RAG_EMBED_CACHE_MAX_ENTRIES", "200000"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+        now = time.time()
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                part = list(keys[i:i + 500])
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddingFunction(_EmbeddingFunctionBase):
+    """Wraps an embedding function so only texts missing from the cache reach the network."""
+
+    def __init__(self, inner, cache: EmbeddingCache):
+        self.inner = inner
+        self.cache = cache
+        self.model = getattr(inner, "model", type(inner).__name__)
+        self.hits = 0
+        self.misses = 0
+
+    def _split(self, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], Dict[str, str]]:
+        keys = [_text_key(self.model, t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+        return keys, found, missing
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        with span("embedding", "cache", texts=len(texts)) as trace:
+            keys, found, missing = self._split(texts)
+            trace.set(cache_hits=len(texts) - len(missing), misses=len(missing))
+            if missing:
+                fresh = dict(zip(missing.keys(), self.inner(list(missing.values()))))
+                self.cache.put_many(fresh)
+                found.update(fresh)
+        return [found[key] for key in keys]
+
+    async def acall(self, texts: List[str]) -> List[List[float]]:
+        """Async counterpart of ``__call__``; SQLite access runs off the event loop."""
+        if not texts:
+            return []
+        with span("embedding", "cache", texts=len(texts)) as trace:
+            keys, found, missing = await asyncio.to_thread(self._split, texts)
+            trace.set(cache_hits=len(texts) - len(missing), misses=len(missing))
+            if missing:
+                if hasattr(self.inner, "acall"):
+                    vectors = await self.inner.acall(list(missing.values()))
+                else:
+                    vectors = await asyncio.to_thread(self.inner, list(missing.values()))
+                fresh = dict(zip(missing.keys(), vectors))
+                await asyncio.to_thread(self.cache.put_many, fresh)
+                found.update(fresh)
+        return [found[key] for key in keys]
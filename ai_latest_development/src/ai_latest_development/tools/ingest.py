@@ -0,0 +1,176 @@
+import contextvars
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (id, document, metadata) as written to the vector store
+ChunkRecord = Tuple[str, str, dict]
+
+
+@dataclass
+class StageStats:
+    """Counters for one pipeline stage."""
+
+    items: int = 0
+    seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class IngestStats:
+    """Per-stage throughput of one ingestion run."""
+
+    documents: int = 0
+    extract: StageStats = field(default_factory=StageStats)  # items = pages
+    chunk: StageStats = field(default_factory=StageStats)  # items = chunks
+    embed: StageStats = field(default_factory=StageStats)  # items = chunks
+    write: StageStats = field(default_factory=StageStats)  # items = chunks
+    wall_seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Indexed {self.documents} documents in {self.wall_seconds:.1f}s | "
+            f"extract {self.extract.items} pages ({self.extract.throughput:.1f}/s) | "
+            f"chunk {self.chunk.items} ({self.chunk.throughput:.1f}/s) | "
+            f"embed {self.embed.items} ({self.embed.throughput:.1f}/s) | "
+            f"write {self.write.items} ({self.write.throughput:.1f}/s)"
+        )
+
+
+def _timed_extract(extract_fn: Callable[[Path], List[str]], path: Path) -> Tuple[List[str], float]:
+    started = time.perf_counter()
+    pages = extract_fn(path)
+    return pages, time.perf_counter() - started
+
+
+def _iter_extracted(
+    paths: List[Path],
+    extract_fn: Callable[[Path], List[str]],
+    workers: int,
+    stats: IngestStats,
+) -> Iterator[Tuple[Path, List[str]]]:
+    """Yield (path, pages) in input order, keeping at most ``2 * workers`` documents pending.
+
+    Documents still parse in parallel; yielding in order keeps chunking (and the
+    near-duplicate decisions made there) independent of which worker finishes first.
+    """
+    if workers <= 1:
+        for path in paths:
+            pages, seconds = _timed_extract(extract_fn, path)
+            stats.extract.items += len(pages)
+            stats.extract.seconds += seconds
+            yield path, pages
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = deque(paths)
+        pending: deque = deque()
+        while queue or pending:
+            while queue and len(pending) < workers * 2:
+                path = queue.popleft()
+                pending.append((pool.submit(_timed_extract, extract_fn, path), path))
+            done, path = pending.popleft()
+            pages, seconds = done.result()
+            stats.extract.items += len(pages)
+            stats.extract.seconds += seconds
+            yield path, pages
+
+
+def _iter_batches(records: Iterable[ChunkRecord], size: int) -> Iterator[List[ChunkRecord]]:
+    batch: List[ChunkRecord] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_pipeline(
+    paths: List[Path],
+    extract_fn: Callable[[Path], List[str]],
+    chunk_fn: Callable[[Path, List[str]], Iterable[ChunkRecord]],
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    write_fn: Callable[[List[str], List[str], List[dict], List[List[float]]], None],
+    done_fn: Callable[[Path, int], None] | None = None,
+    parse_workers: int | None = None,
+    batch_size: int | None = None,
+    max_inflight: int | None = None,
+) -> IngestStats:
+    """Stream documents through extract -> chunk -> embed -> write.
+
+    Extraction runs in a process pool while embedding runs in a thread pool, so
+    CPU-bound PDF parsing overlaps with network-bound embedding. Chunks are
+    written in batches of ``batch_size`` with at most ``max_inflight`` batches
+    embedded concurrently, which keeps memory bounded regardless of document size.
+    """
+    parse_workers = parse_workers if parse_workers is not None else int(
+        os.getenv("RAG_PARSE_WORKERS", str(min(4, os.cpu_count() or 1)))
+    )
+    batch_size = max(1, batch_size or int(os.getenv("RAG_WRITE_BATCH_SIZE", "200")))
+    max_inflight = max(1, max_inflight or int(os.getenv("RAG_EMBED_INFLIGHT", "2")))
+
+    stats = IngestStats()
+    started = time.perf_counter()
+    # (path, chunks in document, global chunk count at which the document is fully written)
+    completed: deque = deque()
+
+    def chunks() -> Iterator[ChunkRecord]:
+        for path, pages in _iter_extracted(paths, extract_fn, parse_workers, stats):
+            stats.documents += 1
+            emitted = 0
+            t0 = time.perf_counter()
+            for record in chunk_fn(path, pages):
+                stats.chunk.seconds += time.perf_counter() - t0
+                stats.chunk.items += 1
+                emitted += 1
+                yield record
+                t0 = time.perf_counter()
+            stats.chunk.seconds += time.perf_counter() - t0
+            completed.append((path, emitted, stats.chunk.items))
+
+    def notify_done(final: bool = False) -> None:
+        while completed and (final or completed[0][2] <= stats.write.items):
+            path, emitted, _ = completed.popleft()
+            if done_fn is not None:
+                done_fn(path, emitted)
+
+    def embed(batch: List[ChunkRecord]) -> Tuple[List[ChunkRecord], List[List[float]], float]:
+        t0 = time.perf_counter()
+        vectors = embed_fn([doc for _, doc, _ in batch])
+        return batch, vectors, time.perf_counter() - t0
+
+    def write(result: Tuple[List[ChunkRecord], List[List[float]], float]) -> None:
+        batch, vectors, seconds = result
+        stats.embed.items += len(batch)
+        stats.embed.seconds += seconds
+        t0 = time.perf_counter()
+        write_fn([r[0] for r in batch], [r[1] for r in batch], [r[2] for r in batch], vectors)
+        stats.write.seconds += time.perf_counter() - t0
+        stats.write.items += len(batch)
+        notify_done()
+
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        inflight: deque = deque()
+        for batch in _iter_batches(chunks(), batch_size):
+            # A context copy per batch keeps embedding trace spans under the caller's build span
+            inflight.append(pool.submit(contextvars.copy_context().run, embed, batch))
+            if len(inflight) >= max_inflight:
+                write(inflight.popleft().result())
+        while inflight:
+            write(inflight.popleft().result())
+    notify_done(final=True)
+
+    stats.wall_seconds = time.perf_counter() - started
+    logger.info(stats.summary())
+    return stats
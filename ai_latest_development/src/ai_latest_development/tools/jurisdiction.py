@@ -0,0 +1,107 @@
+import operator
+from typing import Dict, List
+
+# Filename prefixes used in the AiRules folder, e.g. "EU_AI Act (Full Text + Annexes).pdf"
+JURISDICTIONS = ("EU", "USA", "Canada", "ISO", "OECD", "UNESCO")
+# International standards and principles that apply whatever the target region
+GLOBAL_JURISDICTIONS = ("ISO", "OECD", "UNESCO")
+
+_REGION_ALIASES: Dict[str, str] = {
+    "eu": "EU",
+    "europe": "EU",
+    "european union": "EU",
+    "usa": "USA",
+    "us": "USA",
+    "u.s.": "USA",
+    "united states": "USA",
+    "california": "USA",
+    "canada": "Canada",
+}
+
+_OPERATORS = {
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+# Checked in order; the first keyword found in the filename decides the type
+_DOC_TYPES = (
+    ("guide", ("guide", "overview", "summary")),
+    ("regulation", (" act ", "regulation", "resolution", "multi-language")),
+    ("standard", ("iso_iec", "42001", "preview")),
+    ("framework", ("rmf", "profile", "principles", "recommendation")),
+)
+
+
+def document_metadata(filename: str) -> Dict[str, str]:
+    """Jurisdiction, scope and document type derived from an AiRules filename."""
+    prefix = filename.split("_", 1)[0]
+    jurisdiction = next((j for j in JURISDICTIONS if j.lower() == prefix.lower()), "other")
+    lowered = filename.lower()
+    doc_type = next(
+        (name for name, keywords in _DOC_TYPES if any(word in lowered for word in keywords)),
+        "other",
+    )
+    return {
+        "jurisdiction": jurisdiction,
+        "scope": "global" if jurisdiction in GLOBAL_JURISDICTIONS else "regional",
+        "doc_type": doc_type,
+    }
+
+
+def region_jurisdictions(region: str | None) -> List[str] | None:
+    """Jurisdictions worth searching for ``region``, or None to search the whole corpus.
+
+    A known region maps to its own documents plus the global standards. Regions
+    without dedicated documents in the corpus (UK, "Global", custom entries) are
+    not narrowed down.
+    """
+    if not region:
+        return None
+    jurisdiction = _REGION_ALIASES.get(region.strip().lower())
+    if jurisdiction is None:
+        return None
+    return [jurisdiction, *GLOBAL_JURISDICTIONS]
+
+
+def build_where(region: str | None = None, where: dict | None = None) -> dict | None:
+    """Combine a region restriction with an explicit Chroma ``where`` filter."""
+    clauses = []
+    jurisdictions = region_jurisdictions(region)
+    if jurisdictions:
+        clauses.append({"jurisdiction": {"$in": jurisdictions}})
+    if where:
+        clauses.append(where)
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def matches_where(meta: dict, where: dict | None) -> bool:
+    """Evaluate the subset of Chroma's ``where`` syntax used by this project against metadata."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(meta, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(meta, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = meta.get(key)
+            for op, operand in condition.items():
+                try:
+                    if not _OPERATORS[op](value, operand):
+                        return False
+                except TypeError:
+                    # Ordering comparisons against a missing key
+                    return False
+        elif meta.get(key) != condition:
+            return False
+    return True
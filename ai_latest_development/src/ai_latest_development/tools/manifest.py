@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Set
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    """Indexing state of one source file."""
+
+    source: str
+    sha256: str
+    size: int
+    mtime_ns: int
+    chunker_version: str
+    embedding_model: str
+    chunks: int = 0
+    complete: bool = False
+    # Earlier sources whose chunks made some of this file's chunks near-duplicates
+    suppressed_by: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ManifestDiff:
+    """Files to add, replace, delete or resume to bring the index up to date."""
+
+    added: List[Path] = field(default_factory=list)
+    changed: List[Path] = field(default_factory=list)
+    resumed: List[Path] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[Path] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.resumed or self.removed)
+
+
+class IndexManifest:
+    """JSON manifest recording content hash, chunker version and embedding model per source file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, ManifestEntry] = {}
+        self.load()
+
+    def load(self) -> None:
+        self.entries = {}
+        if not self.path.exists():
+            return
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            # A corrupt manifest only costs a re-index, never a wrong answer
+            return
+        for source, entry in (raw.get("files") or {}).items():
+            try:
+                self.entries[source] = ManifestEntry(**entry)
+            except TypeError:
+                continue
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"files": {source: asdict(entry) for source, entry in sorted(self.entries.items())}}
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _hash(self, path: Path, stat: os.stat_result) -> str:
+        entry = self.entries.get(path.name)
+        # Reuse the stored hash when size and mtime are untouched to avoid re-reading large PDFs
+        if entry and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+            return entry.sha256
+        return file_sha256(path)
+
+    def diff(self, files: List[Path], chunker_version: str, embedding_model: str) -> ManifestDiff:
+        result = ManifestDiff()
+        seen = set()
+        for path in files:
+            seen.add(path.name)
+            entry = self.entries.get(path.name)
+            if entry is None:
+                result.added.append(path)
+                continue
+            stat = path.stat()
+            if (
+                self._hash(path, stat) != entry.sha256
+                or entry.chunker_version != chunker_version
+                or entry.embedding_model != embedding_model
+            ):
+                result.changed.append(path)
+            elif not entry.complete:
+                result.resumed.append(path)
+            else:
+                result.unchanged.append(path)
+        result.removed = sorted(source for source in self.entries if source not in seen)
+        return result
+
+    def start(self, path: Path, chunker_version: str, embedding_model: str) -> ManifestEntry:
+        """Record that ``path`` is being (re-)indexed; the entry stays incomplete until ``finish``."""
+        stat = path.stat()
+        entry = ManifestEntry(
+            source=path.name,
+            sha256=self._hash(path, stat),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            chunker_version=chunker_version,
+            embedding_model=embedding_model,
+        )
+        self.entries[path.name] = entry
+        return entry
+
+    def finish(self, source: str, chunks: int, suppressed_by: List[str] | None = None) -> None:
+        entry = self.entries[source]
+        entry.chunks = chunks
+        entry.suppressed_by = sorted(suppressed_by or [])
+        entry.complete = True
+
+    def dependents(self, sources: Set[str], candidates: List[Path]) -> List[Path]:
+        """Files in ``candidates`` that lost chunks as near-duplicates of ``sources``, directly or transitively.
+
+        Duplicates are only ever suppressed by sources that sort earlier, so one
+        pass in name order finds the whole chain.
+        """
+        affected = set(sources)
+        found = []
+        for path in sorted(candidates, key=lambda p: p.name):
+            entry = self.entries.get(path.name)
+            if entry is not None and affected.intersection(entry.suppressed_by):
+                affected.add(path.name)
+                found.append(path)
+        return found
+
+    def remove(self, source: str) -> None:
+        self.entries.pop(source, None)
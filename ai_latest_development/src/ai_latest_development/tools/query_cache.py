@@ -0,0 +1,159 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable, Tuple
+
+_MISSING = object()
+_SPACE_RE = re.compile(r"\s+")
+
+
+class Uncached:
+    """A computed value handed to the caller and any coalesced waiters but not stored in the cache."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+def make_key(question: str, **params: Any) -> Tuple[str, str]:
+    """Cache key from the whitespace/case-normalised question and the remaining query parameters."""
+    normalized = _SPACE_RE.sub(" ", question).strip().lower()
+    return normalized, json.dumps(params, sort_keys=True, default=str)
+
+
+class QueryCache:
+    """Thread-safe LRU cache of retrieval results with TTL expiry and single-flight coalescing.
+
+    Every entry is stored with the ``generation`` it was computed under (derived
+    from the index manifest); a lookup under a different generation is a miss, so
+    rebuilding the index invalidates the cache without explicit calls.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Hashable, Any]]" = OrderedDict()
+        self._inflight: dict = {}
+        # Strong references to running shared async lookups
+        self._tasks: set = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _lookup(self, key: Hashable, generation: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, entry_generation, value = entry
+        if entry_generation != generation or expires_at < time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, generation: Hashable) -> Any:
+        """Return the cached value or None."""
+        with self._lock:
+            value = self._lookup(key, generation)
+            if value is _MISSING:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, generation: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _join_flight(self, key: Hashable, generation: Hashable) -> Tuple[Any, Future | None, bool]:
+        """Return (cached value, flight future, is_leader) under the lock."""
+        with self._lock:
+            value = self._lookup(key, generation)
+            if value is not _MISSING:
+                self.hits += 1
+                return value, None, False
+            future = self._inflight.get((key, generation))
+            if future is None:
+                self.misses += 1
+                future = Future()
+                self._inflight[(key, generation)] = future
+                return _MISSING, future, True
+            self.coalesced += 1
+            return _MISSING, future, False
+
+    def _land(self, key: Hashable, generation: Hashable) -> None:
+        with self._lock:
+            self._inflight.pop((key, generation), None)
+
+    def _store(self, key: Hashable, generation: Hashable, value: Any) -> Any:
+        if isinstance(value, Uncached):
+            return value.value
+        self.put(key, generation, value)
+        return value
+
+    def get_or_compute(self, key: Hashable, generation: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached value, or compute it once even if several threads ask concurrently.
+
+        ``compute`` may wrap its result in ``Uncached`` to keep it out of the cache.
+        """
+        value, future, leader = self._join_flight(key, generation)
+        if future is None:
+            return value
+        if not leader:
+            return future.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            value = self._store(key, generation, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._land(key, generation)
+
+    async def aget_or_compute(
+        self, key: Hashable, generation: Hashable, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Async ``get_or_compute``; shares in-flight lookups with sync callers too.
+
+        The shared lookup runs in its own task, so a caller that times out or is
+        cancelled (including the one that started it) leaves it running for the rest.
+        """
+        value, future, leader = self._join_flight(key, generation)
+        if future is None:
+            return value
+        if leader:
+            task = asyncio.ensure_future(self._acompute(key, generation, compute, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        # shield: a cancelled caller must not cancel the shared lookup
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def _acompute(
+        self, key: Hashable, generation: Hashable, compute: Callable[[], Awaitable[Any]], future: Future
+    ) -> None:
+        try:
+            value = await compute()
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(self._store(key, generation, value))
+        finally:
+            self._land(key, generation)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,731 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import random
+import re
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import List, Tuple
+
+try:
+    from chromadb.utils import embedding_functions
+    _EmbeddingFunctionBase = embedding_functions.EmbeddingFunction
+except Exception:  # pragma: no cover - the NumPy vector backend works without chromadb
+    _EmbeddingFunctionBase = object
+
+try:
+    import google.generativeai as genai
+except Exception as e:  # pragma: no cover
+    genai = None
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except Exception:  # pragma: no cover
+    google_exceptions = None
+
+try:
+    from pypdf import PdfReader
+except Exception:
+    PdfReader = None
+
+try:
+    from .blocking import query_timeout, run_blocking
+    from .bm25 import BM25Index
+    from .chunking import NearDuplicateIndex, chunk_pages, simhash
+    from .embedding_cache import CachedEmbeddingFunction, EmbeddingCache
+    from .ingest import IngestStats, run_pipeline
+    from .jurisdiction import build_where, document_metadata
+    from .manifest import IndexManifest, file_sha256
+    from .query_cache import QueryCache, Uncached, make_key
+    from .text_cache import PageTextCache
+    from .vector_store import VectorStore, open_vector_store
+except Exception:  # Allows running as a script without package context
+    from blocking import query_timeout, run_blocking
+    from bm25 import BM25Index
+    from chunking import NearDuplicateIndex, chunk_pages, simhash
+    from embedding_cache import CachedEmbeddingFunction, EmbeddingCache
+    from ingest import IngestStats, run_pipeline
+    from jurisdiction import build_where, document_metadata
+    from manifest import IndexManifest, file_sha256
+    from query_cache import QueryCache, Uncached, make_key
+    from text_cache import PageTextCache
+    from vector_store import VectorStore, open_vector_store
+
+try:
+    from ..tracing import span
+except Exception:  # Allows running as a script without package context
+    from tracing import span
+
+# Bump whenever chunk boundaries or chunk metadata change so the manifest re-indexes every document
+CHUNKER_VERSION = "5"
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper
+RRF_K = 60
+
+# Bump whenever _read_pdf_pages output changes so cached page text is re-extracted
+EXTRACTOR_VERSION = "1"
+
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingError(RuntimeError):
+    """Raised when a batch of texts could not be embedded."""
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """Return True for rate-limit and transient transport errors."""
+    if google_exceptions is not None and isinstance(
+        exc,
+        (
+            google_exceptions.TooManyRequests,
+            google_exceptions.ResourceExhausted,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.InternalServerError,
+        ),
+    ):
+        return True
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in ("429", "rate limit", "quota", "503", "unavailable", "timed out"))
+
+
+class GeminiEmbeddingFunction(_EmbeddingFunctionBase):
+    """Embedding function adapter for Chroma using Gemini embeddings.
+
+    Texts are sent in batches of ``batch_size`` per request, with up to
+    ``max_workers`` batches in flight at once. Rate-limit and transient errors
+    are retried with exponential backoff; anything else (or exhausting the
+    retries) raises ``EmbeddingError`` so no placeholder vectors reach the index.
+    """
+
+    def __init__(
+        self,
+        model: str = "text-embedding-004",
+        api_key_env: str = "GEMINI_API_KEY",
+        batch_size: int | None = None,
+        max_workers: int | None = None,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        self.model = model
+        self.api_key_env = api_key_env
+        # Gemini accepts at most 100 texts per batch embedding request
+        self.batch_size = max(1, min(100, batch_size or int(os.getenv("RAG_EMBED_BATCH_SIZE", "100"))))
+        self.max_workers = max(1, max_workers or int(os.getenv("RAG_EMBED_WORKERS", "4")))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._configured = False
+
+    def _ensure_configured(self) -> None:
+        if self._configured:
+            return
+        api_key = os.getenv(self.api_key_env) or os.getenv("GOOGLE_API_KEY")
+        if genai is None:
+            raise RuntimeError("google-generativeai is not installed. Please add it to dependencies.")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY or GOOGLE_API_KEY not set in environment.")
+        genai.configure(api_key=api_key)
+        self._configured = True
+
+    @staticmethod
+    def _extract_embeddings(resp, expected: int) -> List[List[float]]:
+        if isinstance(resp, dict) and "embedding" in resp:
+            vectors = resp["embedding"]
+        elif hasattr(resp, "embedding"):
+            vectors = getattr(resp, "embedding")
+        elif hasattr(resp, "embeddings") and resp.embeddings:  # type: ignore[attr-defined]
+            vectors = [e.values for e in resp.embeddings]  # type: ignore[attr-defined]
+        else:
+            raise EmbeddingError(f"Unexpected embedding response type: {type(resp).__name__}")
+        # A single-text request returns one flat vector rather than a list of vectors
+        if vectors and not isinstance(vectors[0], (list, tuple)):
+            vectors = [vectors]
+        if len(vectors) != expected:
+            raise EmbeddingError(f"Expected {expected} embeddings, got {len(vectors)}")
+        return [list(v) for v in vectors]
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [list(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+
+    def _embed_batch(self, batch: List[str], trace=None) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                resp = genai.embed_content(model=self.model, content=batch)
+                return self._extract_embeddings(resp, len(batch))
+            except EmbeddingError:
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise EmbeddingError(f"Embedding batch of {len(batch)} texts failed: {e}") from e
+                if trace is not None:
+                    trace.incr("retries")
+                time.sleep(self._backoff_delay(attempt))
+                attempt += 1
+
+    async def _aembed_batch(self, batch: List[str], trace=None) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                if hasattr(genai, "embed_content_async"):
+                    resp = await genai.embed_content_async(model=self.model, content=batch)
+                else:  # pragma: no cover - older google-generativeai releases
+                    resp = await asyncio.to_thread(genai.embed_content, model=self.model, content=batch)
+                return self._extract_embeddings(resp, len(batch))
+            except EmbeddingError:
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise EmbeddingError(f"Embedding batch of {len(batch)} texts failed: {e}") from e
+                if trace is not None:
+                    trace.incr("retries")
+                await asyncio.sleep(self._backoff_delay(attempt))
+                attempt += 1
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        self._ensure_configured()
+        batches = self._batches(texts)
+        with span("embedding", self.model, texts=len(texts), batches=len(batches)) as trace:
+            # Pool threads do not see the caller's context, so retries are counted on the span directly
+            embed = partial(self._embed_batch, trace=trace)
+            if len(batches) == 1 or self.max_workers == 1:
+                results = [embed(b) for b in batches]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                    results = list(pool.map(embed, batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    async def acall(self, texts: List[str]) -> List[List[float]]:
+        """Async counterpart of ``__call__`` using the async Gemini client."""
+        if not texts:
+            return []
+        self._ensure_configured()
+        limit = asyncio.Semaphore(self.max_workers)
+        batches = self._batches(texts)
+
+        with span("embedding", self.model, texts=len(texts), batches=len(batches)) as trace:
+            async def run(batch: List[str]) -> List[List[float]]:
+                async with limit:
+                    return await self._aembed_batch(batch, trace)
+
+            results = await asyncio.gather(*(run(b) for b in batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+
+class HashingEmbeddingFunction(_EmbeddingFunctionBase):
+    """Deterministic offline embeddings: signed feature hashing of word unigrams and bigrams.
+
+    Needs no network or model, so indexes can be built and searched without a
+    Gemini key (e.g. by the benchmark). The vectors capture word overlap only.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.model = f"local-hashing-{dim}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+
+def _read_pdf_pages(pdf_path: Path) -> List[str]:
+    if PdfReader is None:
+        raise RuntimeError("pypdf is not installed. Please add it to dependencies.")
+    reader = PdfReader(str(pdf_path))
+    pages = []
+    for page in reader.pages:
+        try:
+            pages.append(page.extract_text() or "")
+        except Exception:
+            pages.append("")
+    return pages
+
+
+def _read_pdf_pages_cached(pdf_path: Path, cache_dir: Path) -> List[str]:
+    """Return page texts from the extracted-text cache, parsing and caching the PDF on a miss."""
+    cache = PageTextCache(cache_dir, EXTRACTOR_VERSION)
+    digest = file_sha256(pdf_path)
+    pages = cache.get(digest)
+    if pages is None:
+        pages = _read_pdf_pages(pdf_path)
+        cache.put(digest, pages)
+    return pages
+
+
+def _read_pdf_text(pdf_path: Path) -> str:
+    return "\n\n".join(_read_pdf_pages(pdf_path))
+
+
+def _chunk_text(text: str, max_tokens: int = 350, overlap_tokens: int = 60) -> List[str]:
+    return [c.text for c in chunk_pages([text], max_tokens=max_tokens, overlap_tokens=overlap_tokens)]
+
+
+class RAGIndex:
+    """Persistent RAG index over a pluggable vector store with Gemini embeddings.
+
+    ``backend`` picks the vector store (``chroma`` or ``numpy``) and defaults to
+    ``RAG_VECTOR_BACKEND``. The manifest and BM25 index live next to the store's
+    files; the embedding and page text caches are shared by all backends.
+    ``embedding_fn`` replaces the Gemini embeddings, e.g. with a local model; it
+    needs a ``model`` attribute, which the manifest records.
+    """
+
+    def __init__(self, data_dir: Path, index_dir: Path, backend: str | None = None, embedding_fn=None):
+        self.data_dir = data_dir
+        self.index_dir = index_dir
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.embedding_fn = embedding_fn or GeminiEmbeddingFunction()
+        # Shared by build() and query() so unchanged chunks and repeated questions skip the network
+        if os.getenv("RAG_EMBED_CACHE", "1") != "0":
+            self.embedding_fn = CachedEmbeddingFunction(
+                self.embedding_fn, EmbeddingCache(self.index_dir / "embedding_cache.sqlite3")
+            )
+        self.store: VectorStore = open_vector_store(
+            backend or os.getenv("RAG_VECTOR_BACKEND", "chroma"), self.index_dir, self.embedding_fn
+        )
+        self.manifest = IndexManifest(self.store.directory / "manifest.json")
+        self.text_cache_dir = self.index_dir / "text_cache"
+        self.chunk_tokens = int(os.getenv("RAG_CHUNK_TOKENS", "350"))
+        self.chunk_overlap_tokens = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "60"))
+        # Max SimHash Hamming distance for a chunk to count as a near-duplicate; negative disables
+        self.dedup_distance = int(os.getenv("RAG_DEDUP_DISTANCE", "3"))
+        self._dedup: NearDuplicateIndex | None = None
+        self._dedup_backlog: deque = deque()
+        self._resume_ids: dict = {}
+        self._chunk_totals: dict = {}
+        self._suppressed_by: dict = {}
+        self.lexical = BM25Index(self.store.directory / "bm25.json.gz")
+        self.query_cache = QueryCache(
+            max_entries=int(os.getenv("RAG_QUERY_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("RAG_QUERY_CACHE_TTL", "600")),
+        )
+
+    def _existing_ids(self, source: str) -> set:
+        return self.store.ids(source)
+
+    def _delete_source(self, source: str) -> None:
+        self.store.delete_source(source)
+        self.lexical.remove_source(source)
+
+    def _sync_lexical(self) -> None:
+        """Backfill the BM25 index from the vector store for chunks written before it existed or before an interruption."""
+        if len(self.lexical) == self.store.count():
+            return
+        self.lexical.load()
+        missing = [
+            (chunk_id, doc, meta) for chunk_id, doc, meta, _ in self.store.records()
+            if chunk_id not in self.lexical.documents
+        ]
+        self.lexical.add([m[0] for m in missing], [m[1] for m in missing], [m[2] for m in missing])
+        self.lexical.save()
+
+    @property
+    def chunker_version(self) -> str:
+        return f"{CHUNKER_VERSION}:{self.chunk_tokens}:{self.chunk_overlap_tokens}:{self.dedup_distance}"
+
+    def _load_dedup(self, rebuilding: set) -> NearDuplicateIndex | None:
+        """Start an empty dedup index and queue the stored fingerprints of sources not being rebuilt.
+
+        Queued fingerprints are added in source name order as the build reaches
+        each document (see ``_dedup_before``).
+        """
+        self._dedup_backlog = deque()
+        if self.dedup_distance < 0:
+            return None
+        fingerprints: dict = {}
+        for _, _, meta, _ in self.store.records():
+            if isinstance(meta, dict) and meta.get("simhash") and meta.get("source") not in rebuilding:
+                fingerprints.setdefault(meta["source"], []).append(int(meta["simhash"], 16))
+        self._dedup_backlog = deque(sorted(fingerprints.items()))
+        return NearDuplicateIndex(self.dedup_distance)
+
+    def _dedup_before(self, source: str) -> None:
+        """Add the stored fingerprints of every source sorted before ``source`` to the dedup index."""
+        while self._dedup_backlog and self._dedup_backlog[0][0] < source:
+            owner, values = self._dedup_backlog.popleft()
+            for value in values:
+                self._dedup.add(value, owner)
+
+    def _chunk_document(self, pdf: Path, pages: List[str]):
+        skip = self._resume_ids.get(pdf.name, set())
+        doc_meta = document_metadata(pdf.name)
+        total = 0
+        suppressed_by = set()
+        if self._dedup is not None:
+            self._dedup_before(pdf.name)
+        for i, chunk in enumerate(chunk_pages(pages, self.chunk_tokens, self.chunk_overlap_tokens)):
+            total += 1
+            chunk_id = f"{pdf.stem}_{i}"
+            fingerprint = simhash(chunk.text)
+            if self._dedup is not None:
+                # Guides and consolidated versions quote the AI Act verbatim; keep the copy
+                # in the first source by name, so the survivor does not depend on timing
+                owner = self._dedup.owner_of(fingerprint) if chunk_id not in skip else None
+                if owner is not None:
+                    if owner != pdf.name:
+                        suppressed_by.add(owner)
+                    continue
+                self._dedup.add(fingerprint, pdf.name)
+            if chunk_id in skip:
+                continue
+            yield chunk_id, chunk.text, {
+                "source": pdf.name,
+                "chunk": i,
+                "page_start": chunk.page_start,
+                "page_end": chunk.page_end,
+                "section": chunk.section,
+                "tokens": chunk.tokens,
+                "simhash": f"{fingerprint:016x}",
+                **doc_meta,
+            }
+        self._chunk_totals[pdf.name] = total
+        self._suppressed_by[pdf.name] = suppressed_by
+
+    def _write(self, ids: List[str], documents: List[str], metadatas: List[dict], embeddings: List[List[float]]) -> None:
+        self.store.add(ids, documents, metadatas, embeddings)
+        self.lexical.add(ids, documents, metadatas)
+
+    def _document_done(self, pdf: Path, _written: int) -> None:
+        # Vectors first: the manifest must never mark a document finished that the store lost
+        self.store.persist()
+        self.lexical.save()
+        self.manifest.finish(pdf.name, self._chunk_totals.pop(pdf.name, 0), self._suppressed_by.pop(pdf.name, None))
+        self.manifest.save()
+
+    def build(self) -> IngestStats:
+        """Bring the vector store in line with the corpus using the manifest diff.
+
+        New files are indexed, changed files (content, chunker or embedding model)
+        are replaced, removed files are deleted and interrupted files are resumed
+        from the chunks already written. Unchanged files are not touched, except
+        those that lost chunks as near-duplicates of a changed or removed file,
+        which are re-indexed so that content is not lost with it.
+        """
+        with span("index", "build", backend=self.store.name) as trace:
+            stats = self._build()
+            trace.set(
+                documents=stats.documents,
+                pages=stats.extract.items,
+                chunks=stats.write.items,
+                extract_seconds=round(stats.extract.seconds, 3),
+                embed_seconds=round(stats.embed.seconds, 3),
+                write_seconds=round(stats.write.seconds, 3),
+            )
+        return stats
+
+    def _build(self) -> IngestStats:
+        model = self.embedding_fn.model
+        diff = self.manifest.diff(sorted(self.data_dir.glob("*.pdf")), self.chunker_version, model)
+        dependents = self.manifest.dependents(
+            set(diff.removed) | {pdf.name for pdf in diff.changed}, diff.unchanged
+        )
+        for source in diff.removed:
+            self._delete_source(source)
+            self.manifest.remove(source)
+        # Added files are cleared as well in case chunks predate the manifest
+        for pdf in diff.added + diff.changed + dependents:
+            self._delete_source(pdf.name)
+            self.manifest.start(pdf, self.chunker_version, model)
+        # Name order, so near-duplicates always resolve to the same surviving copy
+        pending = sorted(diff.added + diff.changed + diff.resumed + dependents, key=lambda p: p.name)
+        self._resume_ids = {pdf.name: self._existing_ids(pdf.name) for pdf in diff.resumed}
+        self._chunk_totals = {}
+        self._suppressed_by = {}
+        self._dedup = self._load_dedup({pdf.name for pdf in pending})
+        self._sync_lexical()
+        self.lexical.save()
+        self.manifest.save()
+        stats = run_pipeline(
+            pending,
+            extract_fn=partial(_read_pdf_pages_cached, cache_dir=self.text_cache_dir),
+            chunk_fn=self._chunk_document,
+            embed_fn=self.embedding_fn,
+            write_fn=self._write,
+            done_fn=self._document_done,
+        )
+        PageTextCache(self.text_cache_dir, EXTRACTOR_VERSION).prune(
+            entry.sha256 for entry in self.manifest.entries.values()
+        )
+        return stats
+
+    def clear(self) -> None:
+        """Drop this backend's vectors, manifest and BM25 index.
+
+        The embedding and page text caches are shared by all backends and kept,
+        so the next ``build`` re-chunks the corpus without re-extracting or re-embedding it.
+        """
+        self.store.clear()
+        for path in (self.manifest.path, self.lexical.path):
+            path.unlink(missing_ok=True)
+        self.manifest.load()
+        self.lexical.load()
+        self.query_cache.clear()
+
+    def import_from(self, backend: str, batch_size: int = 500) -> int:
+        """Replace this index's vectors with a copy of the ``backend`` store of the same index directory.
+
+        Stored embeddings are copied as-is (no embedding calls), together with the
+        manifest and BM25 index, so the copy is immediately up to date. Returns
+        the number of chunks copied.
+        """
+        source = open_vector_store(backend, self.index_dir, self.embedding_fn)
+        if source.directory == self.store.directory:
+            raise ValueError(f"Cannot import the '{backend}' vector store into itself")
+        self.store.clear()
+        copied = 0
+        batch: list = []
+        for record in source.records(include_embeddings=True):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                copied += self._import_batch(batch)
+                batch = []
+        copied += self._import_batch(batch)
+        self.store.persist()
+        for name in ("manifest.json", "bm25.json.gz"):
+            if (source.directory / name).exists():
+                shutil.copyfile(source.directory / name, self.store.directory / name)
+        self.manifest = IndexManifest(self.store.directory / "manifest.json")
+        self.lexical = BM25Index(self.store.directory / "bm25.json.gz")
+        self._sync_lexical()
+        self.query_cache.clear()
+        return copied
+
+    def _import_batch(self, batch: list) -> int:
+        if batch:
+            self.store.add(
+                [r[0] for r in batch], [r[1] for r in batch], [r[2] for r in batch], [r[3] for r in batch]
+            )
+        return len(batch)
+
+    def pages(self, source: str) -> List[str]:
+        """Return the extracted per-page text of an indexed source file (e.g. ``EU_AI Act (Full Text + Annexes).pdf``)."""
+        return _read_pdf_pages_cached(self.data_dir / source, self.text_cache_dir)
+
+    def _vector_query(self, questions: List[str], k: int, where: dict | None = None) -> List[List[Tuple[str, str, dict]]]:
+        # One embedding request and one vector store lookup for all questions
+        embeddings = self.embedding_fn(questions)
+        with span("vector_store", self.store.name, queries=len(questions), k=k):
+            return self.store.query(embeddings, k, where)
+
+    async def _avector_query(
+        self, questions: List[str], k: int, where: dict | None = None
+    ) -> List[List[Tuple[str, str, dict]]]:
+        embed_async = getattr(self.embedding_fn, "acall", None)
+        if embed_async is not None:
+            embeddings = await embed_async(questions)
+        else:
+            embeddings = await run_blocking(self.embedding_fn, questions)
+        with span("vector_store", self.store.name, queries=len(questions), k=k):
+            return await run_blocking(partial(self.store.query, embeddings, k, where))
+
+    def query(
+        self,
+        question: str,
+        k: int = 6,
+        mode: str | None = None,
+        region: str | None = None,
+        where: dict | None = None,
+    ) -> List[Tuple[str, dict]]:
+        """Return the top-k (document, metadata) pairs for ``question``.
+
+        ``region`` restricts the search to that jurisdiction's documents plus the
+        global standards (ISO, OECD, UNESCO); ``where`` is an additional Chroma
+        metadata filter, e.g. ``{"doc_type": "regulation"}``.
+
+        ``mode`` is ``hybrid`` (BM25 and vector results merged by reciprocal rank
+        fusion), ``vector`` or ``lexical``; it defaults to ``RAG_SEARCH_MODE``.
+        Lexical search runs fully in-process, and hybrid search falls back to it
+        when the embedding API is unavailable. Results are served from
+        ``query_cache`` until they expire or the manifest changes.
+        """
+        mode, where = _resolve_mode(mode), build_where(region, where)
+        key = make_key(question, k=k, mode=mode, where=where)
+        with span("retrieval", "query", mode=mode, k=k, queries=1, cache_hits=1) as trace:
+            def compute() -> List[Tuple[str, dict]]:
+                trace.set(cache_hits=0)
+                results, degraded = self._query_batch([question], k, mode, where)
+                # Lexical-only fallback results are not cached, so they vanish once the embedding API recovers
+                return Uncached(results[0]) if degraded else results[0]
+
+            # Identical concurrent questions (e.g. parallel agents) share one lookup
+            return list(self.query_cache.get_or_compute(key, self._cache_generation(), compute))
+
+    def query_batch(
+        self,
+        questions: List[str],
+        k: int = 6,
+        mode: str | None = None,
+        region: str | None = None,
+        where: dict | None = None,
+    ) -> List[List[Tuple[str, dict]]]:
+        """Like ``query`` for several questions, with a single embedding call and Chroma lookup."""
+        if not questions:
+            return []
+        mode, where = _resolve_mode(mode), build_where(region, where)
+        generation = self._cache_generation()
+        keys = [make_key(q, k=k, mode=mode, where=where) for q in questions]
+        results = [self.query_cache.get(key, generation) for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        with span("retrieval", "query_batch", mode=mode, k=k, queries=len(questions)) as trace:
+            trace.set(cache_hits=len(questions) - len(missing))
+            if missing:
+                fresh, degraded = self._query_batch([questions[i] for i in missing], k, mode, where)
+                for i, hits in zip(missing, fresh):
+                    if not degraded:
+                        self.query_cache.put(keys[i], generation, hits)
+                    results[i] = hits
+        return [list(r) for r in results]
+
+    def _cache_generation(self) -> tuple:
+        """Changes whenever the manifest is rewritten, i.e. whenever the indexed content changes."""
+        try:
+            stat = self.manifest.path.stat()
+        except OSError:
+            return (0, 0)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    async def aquery(
+        self,
+        question: str,
+        k: int = 6,
+        mode: str | None = None,
+        region: str | None = None,
+        where: dict | None = None,
+        timeout: float | None = None,
+    ) -> List[Tuple[str, dict]]:
+        """Async ``query``: embeds with the async Gemini client and runs Chroma in a bounded executor.
+
+        Raises ``asyncio.TimeoutError`` after ``timeout`` seconds (``RAG_QUERY_TIMEOUT``).
+        """
+        mode, where = _resolve_mode(mode), build_where(region, where)
+        key = make_key(question, k=k, mode=mode, where=where)
+
+        with span("retrieval", "query", mode=mode, k=k, queries=1, cache_hits=1) as trace:
+            async def compute() -> List[Tuple[str, dict]]:
+                trace.set(cache_hits=0)
+                results, degraded = await self._aquery_batch([question], k, mode, where)
+                return Uncached(results[0]) if degraded else results[0]
+
+            result = await asyncio.wait_for(
+                self.query_cache.aget_or_compute(key, self._cache_generation(), compute),
+                timeout=query_timeout(timeout),
+            )
+        return list(result)
+
+    async def aquery_batch(
+        self,
+        questions: List[str],
+        k: int = 6,
+        mode: str | None = None,
+        region: str | None = None,
+        where: dict | None = None,
+        timeout: float | None = None,
+    ) -> List[List[Tuple[str, dict]]]:
+        """Async ``query_batch``."""
+        if not questions:
+            return []
+        mode, where = _resolve_mode(mode), build_where(region, where)
+        generation = self._cache_generation()
+        keys = [make_key(q, k=k, mode=mode, where=where) for q in questions]
+        results = [self.query_cache.get(key, generation) for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        with span("retrieval", "query_batch", mode=mode, k=k, queries=len(questions)) as trace:
+            trace.set(cache_hits=len(questions) - len(missing))
+            if missing:
+                fresh, degraded = await asyncio.wait_for(
+                    self._aquery_batch([questions[i] for i in missing], k, mode, where),
+                    timeout=query_timeout(timeout),
+                )
+                for i, hits in zip(missing, fresh):
+                    if not degraded:
+                        self.query_cache.put(keys[i], generation, hits)
+                    results[i] = hits
+        return [list(r) for r in results]
+
+    def _lexical_query(self, questions: List[str], k: int, where: dict | None) -> List[List[Tuple[str, str, dict]]]:
+        return [[(cid, doc, meta) for cid, doc, meta, _ in self.lexical.query(q, k, where)] for q in questions]
+
+    @staticmethod
+    def _vector_fallback(lexical: List[list], error: Exception) -> List[list]:
+        if not any(lexical):
+            raise error
+        logger.warning("Vector search failed, using lexical results only: %s", error)
+        return [[] for _ in lexical]
+
+    def _query_batch(
+        self, questions: List[str], k: int, mode: str, where: dict | None
+    ) -> Tuple[List[List[Tuple[str, dict]]], bool]:
+        """Results per question, and whether hybrid search fell back to lexical results only."""
+        if mode == "lexical":
+            return [_fuse([hits], k) for hits in self._lexical_query(questions, k, where)], False
+        if mode == "vector":
+            return [_fuse([hits], k) for hits in self._vector_query(questions, k, where)], False
+        candidates = k * 3
+        lexical = self._lexical_query(questions, candidates, where)
+        degraded = False
+        try:
+            vector = self._vector_query(questions, candidates, where)
+        except Exception as e:
+            vector, degraded = self._vector_fallback(lexical, e), True
+        return [_fuse([lex, vec], k) for lex, vec in zip(lexical, vector)], degraded
+
+    async def _aquery_batch(
+        self, questions: List[str], k: int, mode: str, where: dict | None
+    ) -> Tuple[List[List[Tuple[str, dict]]], bool]:
+        # BM25 scoring is CPU-bound, so it runs in the retrieval executor like the vector lookup
+        if mode == "lexical":
+            lexical = await run_blocking(self._lexical_query, questions, k, where)
+            return [_fuse([hits], k) for hits in lexical], False
+        if mode == "vector":
+            return [_fuse([hits], k) for hits in await self._avector_query(questions, k, where)], False
+        candidates = k * 3
+        lexical = await run_blocking(self._lexical_query, questions, candidates, where)
+        degraded = False
+        try:
+            vector = await self._avector_query(questions, candidates, where)
+        except Exception as e:
+            vector, degraded = self._vector_fallback(lexical, e), True
+        return [_fuse([lex, vec], k) for lex, vec in zip(lexical, vector)], degraded
+
+
+def _resolve_mode(mode: str | None) -> str:
+    mode = (mode or os.getenv("RAG_SEARCH_MODE", "hybrid")).lower()
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(SEARCH_MODES)}")
+    return mode
+
+
+def _fuse(rankings: List[List[Tuple[str, str, dict]]], k: int) -> List[Tuple[str, dict]]:
+    """Merge ranked (id, document, metadata) lists by reciprocal rank fusion."""
+    fused: dict = {}
+    for ranking in rankings:
+        for rank, (cid, doc, meta) in enumerate(ranking):
+            score, _, _ = fused.get(cid, (0.0, doc, meta))
+            fused[cid] = (score + 1.0 / (RRF_K + rank + 1), doc, meta)
+    best = sorted(fused.values(), key=lambda item: item[0], reverse=True)[:k]
+    return [(doc, meta) for _, doc, meta in best]
@@ -1,202 +1,475 @@
+import asyncio
+import logging
 import os
+import threading
+import time
 from pathlib import Path
-from typing import List, Tuple
+from typing import TYPE_CHECKING, Any, Callable, List, Tuple
 
-import chromadb
-from chromadb.utils import embedding_functions
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
 
 try:
-    import google.generativeai as genai
-except Exception as e:  # pragma: no cover
-    genai = None
+    from .blocking import query_timeout, run_blocking
+    from .context_packer import pack_context
+except Exception:  # Allows running as a script without package context
+    from blocking import query_timeout, run_blocking
+    from context_packer import pack_context
 
 try:
-    from pypdf import PdfReader
-except Exception:
-    PdfReader = None
+    from ..tracing import activate, traced
+except Exception:  # Allows running as a script without package context
+    from tracing import activate, traced
 
+if TYPE_CHECKING:
+    from .rag_index import RAGIndex
 
-class GeminiEmbeddingFunction(embedding_functions.EmbeddingFunction):
-    """Embedding function adapter for Chroma using Gemini embeddings."""
+logger = logging.getLogger(__name__)
 
-    def __init__(self, model: str = "text-embedding-004", api_key_env: str = "GEMINI_API_KEY"):
-        self.model = model
-        self.api_key_env = api_key_env
-        self._configured = False
+# Index lifecycle as reported by index_status(); "degraded" means the index
+# opened but the last build failed part way, so results may be incomplete
+COLD, BUILDING, READY, DEGRADED, FAILED = "cold", "building", "ready", "degraded", "failed"
 
-    def _ensure_configured(self) -> None:
-        if self._configured:
-            return
-        api_key = os.getenv(self.api_key_env) or os.getenv("GOOGLE_API_KEY")
-        if genai is None:
-            raise RuntimeError("google-generativeai is not installed. Please add it to dependencies.")
-        if not api_key:
-            raise RuntimeError("GEMINI_API_KEY or GOOGLE_API_KEY not set in environment.")
-        genai.configure(api_key=api_key)
-        self._configured = True
-
-    def __call__(self, texts: List[str]) -> List[List[float]]:
-        self._ensure_configured()
-        vectors: List[List[float]] = []
-        for t in texts:
-            try:
-                resp = genai.embed_content(model=self.model, content=t)
-                if isinstance(resp, dict) and "embedding" in resp:
-                    vectors.append(resp["embedding"])  # type: ignore[arg-type]
-                elif hasattr(resp, "embedding"):
-                    vectors.append(getattr(resp, "embedding"))
-                elif hasattr(resp, "embeddings") and resp.embeddings:  # type: ignore[attr-defined]
-                    vectors.append(resp.embeddings[0].values)  # type: ignore[attr-defined]
-                else:
-                    # Fallback to zero vector of 768 dims
-                    vectors.append([0.0] * 768)
-            except Exception:
-                vectors.append([0.0] * 768)
-        return vectors
-
-
-def _read_pdf_text(pdf_path: Path) -> str:
-    if PdfReader is None:
-        raise RuntimeError("pypdf is not installed. Please add it to dependencies.")
-    reader = PdfReader(str(pdf_path))
-    pages = []
-    for page in reader.pages:
-        try:
-            pages.append(page.extract_text() or "")
-        except Exception:
-            pages.append("")
-    return "\n\n".join(pages)
-
-
-def _chunk_text(text: str, chunk_size: int = 1200, overlap: int = 200) -> List[str]:
-    chunks: List[str] = []
-    start = 0
-    n = len(text)
-    while start < n:
-        end = min(n, start + chunk_size)
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = max(end - overlap, start + 1)
-    return chunks
-
-
-class RAGIndex:
-    """Simple persistent RAG index using Chroma and Gemini embeddings."""
-
-    def __init__(self, data_dir: Path, index_dir: Path):
-        self.data_dir = data_dir
-        self.index_dir = index_dir
-        self.client = chromadb.PersistentClient(path=str(self.index_dir))
-        self.embedding_fn = GeminiEmbeddingFunction()
-        self.collection = self.client.get_or_create_collection(
-            name="ai_rules",
-            embedding_function=self.embedding_fn,
-            metadata={"hnsw:space": "cosine"}
-        )
+_index_singleton: "RAGIndex | None" = None
+# Concurrent crews (batch mode) share one index; only the first caller builds it
+_index_lock = threading.Lock()
+_index_settled = threading.Event()
+_status: dict = {"state": COLD, "error": None, "started_at": None, "finished_at": None, "summary": None}
+_status_lock = threading.Lock()
+
+
+def _load_index_class():
+    """Import RAGIndex on first use so chromadb, google.generativeai and pypdf stay out of startup."""
+    if __package__:
+        from .rag_index import RAGIndex
+    else:  # Allows running as a script without package context
+        from rag_index import RAGIndex
+    return RAGIndex
 
-    def build(self) -> None:
-        pdf_files = sorted(self.data_dir.glob("*.pdf"))
-        for pdf in pdf_files:
-            doc_id_prefix = pdf.stem
-            # Skip if already indexed by checking one id existence
-            existing = self.collection.get(ids=[f"{doc_id_prefix}_0"], include=["metadatas", "documents"])  # type: ignore[arg-type]
-            if existing and existing.get("ids"):
-                continue
-            text = _read_pdf_text(pdf)
-            chunks = _chunk_text(text)
-            ids = [f"{doc_id_prefix}_{i}" for i in range(len(chunks))]
-            metadatas = [{"source": pdf.name, "chunk": i} for i in range(len(chunks))]
-            if chunks:
-                self.collection.add(ids=ids, documents=chunks, metadatas=metadatas)
 
-    def query(self, question: str, k: int = 6) -> List[Tuple[str, dict]]:
-        res = self.collection.query(query_texts=[question], n_results=k)
-        docs = (res.get("documents") or [[]])[0]
-        metas = (res.get("metadatas") or [[]])[0]
-        return list(zip(docs, metas))
+def _project_dir() -> Path:
+    """Directory holding this project's pyproject.toml, where ``knowledge/`` lives."""
+    for parent in Path(__file__).resolve().parents:
+        if (parent / "pyproject.toml").exists():
+            return parent
+    return Path(__file__).resolve().parents[3]
 
 
-_index_singleton: RAGIndex | None = None
+def _find_corpus_dir(start: Path) -> Path | None:
+    """Walk upwards from ``start`` to the first directory containing an 'AiRules' folder."""
+    for parent in [start, *start.parents]:
+        if (parent / "AiRules").is_dir():
+            return parent / "AiRules"
+    return None
 
 
-def _find_project_root(start: Path) -> Path:
-    """Walk upwards to find the project root that contains 'AiRules' or pyproject.toml.
+def default_index_paths() -> Tuple[Path, Path]:
+    """(corpus dir, index dir), overridable with ``RAG_DATA_DIR`` and ``RAG_INDEX_DIR``.
 
-    Falls back to the top-most parent.
+    The corpus is the nearest 'AiRules' folder above this package (the repository
+    root, one level above the project); the index lives in the project's
+    ``knowledge/rag_index``.
     """
-    current = start
-    last = None
-    while current != last:
-        if (current / "AiRules").exists() or (current / "pyproject.toml").exists():
-            return current
-        last = current
-        current = current.parent
-    return start
+    project_dir = _project_dir()
+    data_dir = os.getenv("RAG_DATA_DIR")
+    index_dir = os.getenv("RAG_INDEX_DIR")
+    return (
+        Path(data_dir) if data_dir else (_find_corpus_dir(project_dir) or project_dir / "AiRules"),
+        Path(index_dir) if index_dir else project_dir / "knowledge" / "rag_index",
+    )
+
 
+def _set_status(**changes) -> None:
+    with _status_lock:
+        _status.update(changes)
 
-def _get_index() -> RAGIndex:
+
+def index_status() -> dict:
+    """Snapshot of the shared index state: ``state``, ``error``, ``started_at``, ``finished_at``, ``summary``."""
+    with _status_lock:
+        return dict(_status)
+
+
+def _get_index() -> "RAGIndex":
+    """Open the shared index, building it from the corpus on first use.
+
+    Build failures are logged and recorded in ``index_status``; the index stays
+    usable with whatever was written before the failure. Failing to open the
+    index at all raises, and the next call tries again.
+    """
     global _index_singleton
-    if _index_singleton is None:
-        # Discover project root robustly (previous implementation pointed one level too shallow)
-        file_path = Path(__file__).resolve()
-        project_root = _find_project_root(file_path.parent)
-        data_dir = project_root / "AiRules"
-        index_dir = project_root / "ai_latest_development" / "knowledge" / "rag_index"
-        index_dir.mkdir(parents=True, exist_ok=True)
-        _index_singleton = RAGIndex(data_dir=data_dir, index_dir=index_dir)
-        # Build only if corpus exists
+    if _index_singleton is not None:
+        return _index_singleton
+    with _index_lock:
+        if _index_singleton is not None:
+            return _index_singleton
+        _index_settled.clear()
+        _set_status(state=BUILDING, error=None, started_at=time.time(), finished_at=None)
+        try:
+            data_dir, index_dir = default_index_paths()
+            index_dir.mkdir(parents=True, exist_ok=True)
+            index = _load_index_class()(data_dir=data_dir, index_dir=index_dir)
+        except Exception as e:
+            logger.exception("Opening the RAG index failed")
+            _set_status(state=FAILED, error=f"{type(e).__name__}: {e}", finished_at=time.time())
+            _index_settled.set()
+            raise
+        state, error, summary = READY, None, None
         if data_dir.exists():
             try:
-                _index_singleton.build()
-            except Exception:
-                # Swallow build errors to keep tool non-fatal; queries will state failure
-                pass
+                summary = index.build().summary()
+            except Exception as e:
+                logger.exception("Building the RAG index failed; serving the partially built index")
+                state, error = DEGRADED, f"{type(e).__name__}: {e}"
+        _index_singleton = index
+        _set_status(state=state, error=error, finished_at=time.time(), summary=summary)
+        _index_settled.set()
     return _index_singleton
 
 
-def rag_search(query: str, k: int = 6) -> str:
+def use_index(index: "RAGIndex") -> None:
+    """Serve every search from ``index`` instead of opening the default one (benchmarks, local embeddings)."""
+    global _index_singleton
+    with _index_lock:
+        _index_singleton = index
+        _set_status(state=READY, error=None, started_at=time.time(), finished_at=time.time(), summary=None)
+        _index_settled.set()
+
+
+def start_index_warmup() -> None:
+    """Open and build the shared index on a background thread; returns immediately.
+
+    Safe to call repeatedly; only the first call in a cold process starts a thread.
+    """
+    with _status_lock:
+        if _status["state"] != COLD:
+            return
+        _status["state"] = BUILDING
+
+    def warm() -> None:
+        try:
+            _get_index()
+        except Exception:
+            pass  # Recorded in index_status by _get_index
+
+    threading.Thread(target=warm, name="rag-index-warmup", daemon=True).start()
+
+
+def _index_not_ready() -> str | None:
+    """Message for the agent while a background warm-up is still building, after waiting ``RAG_WARMUP_WAIT`` seconds."""
+    if _index_singleton is not None or index_status()["state"] != BUILDING:
+        return None
+    if _index_settled.wait(float(os.getenv("RAG_WARMUP_WAIT", "120"))):
+        return None
+    started = index_status()["started_at"] or time.time()
+    return (
+        f"RAG index is still being built ({time.time() - started:.0f}s so far). "
+        "Retry this search in a minute."
+    )
+
+
+def _degraded_note() -> str:
+    status = index_status()
+    if status["state"] != DEGRADED:
+        return ""
+    return f"Note: the last index build failed ({status['error']}); results may be incomplete.\n\n"
+
+
+def _context_settings(k: int, token_budget: int | None) -> Tuple[int, int]:
+    """Number of candidates to retrieve for ``k`` results and the token budget to pack them into."""
+    overfetch = max(1, int(os.getenv("RAG_OVERFETCH", "3")))
+    return k * overfetch, token_budget or int(os.getenv("RAG_CONTEXT_TOKENS", "1200"))
+
+
+def _format_results(results: List[Tuple[str, dict]], k: int, token_budget: int) -> str:
+    passages = pack_context(results, k=k, token_budget=token_budget)
+    if not passages:
+        return "No relevant context found in AiRules."
+    return "\n\n".join(f"[{i}] Source: {p.citation}\n{p.text}" for i, p in enumerate(passages, 1))
+
+
+def _format_batch(queries: List[str], batches: List[List[Tuple[str, dict]]], k: int, token_budget: int) -> str:
+    seen: dict = {}
+    sections: List[str] = []
+    for qi, (query, results) in enumerate(zip(queries, batches), 1):
+        lines = [f"## Query {qi}: {query}"]
+        passages = pack_context(results, k=k, token_budget=token_budget)
+        if not passages:
+            lines.append("No relevant context found in AiRules.")
+        for pi, p in enumerate(passages, 1):
+            label = f"{qi}.{pi}"
+            key = (p.source, tuple(p.chunks)) if p.chunks else (p.source, p.text)
+            if key in seen:
+                lines.append(f"[{label}] Same passage as [{seen[key]}] (Source: {p.citation})")
+                continue
+            seen[key] = label
+            lines.append(f"[{label}] Source: {p.citation}\n{p.text}")
+        sections.append("\n\n".join(lines))
+    return "\n\n".join(sections)
+
+
+@traced("tool", "rag_search")
+def rag_search(
+    query: str,
+    k: int = 6,
+    mode: str | None = None,
+    region: str | None = None,
+    where: dict | None = None,
+    token_budget: int | None = None,
+) -> str:
     """Search AiRules corpus and return top-k chunks with citations.
 
+    ``mode`` selects ``hybrid``, ``vector`` or ``lexical`` retrieval; ``region`` and
+    ``where`` narrow the documents searched (see ``RAGIndex.query``). Candidates
+    are over-fetched, reranked for diversity (MMR), adjacent chunks of the same
+    source are merged and the result is cut to ``token_budget`` tokens.
     Returns a markdown string with numbered snippets and sources.
     """
+    not_ready = _index_not_ready()
+    if not_ready:
+        return not_ready
     try:
         index = _get_index()
     except Exception as e:
         return f"RAG unavailable: {e}"
     # Validate corpus exists
     if not index.data_dir.exists():
-        return "No AiRules corpus found. Ensure the 'AiRules' folder exists at project root."
+        return f"No AiRules corpus found at {index.data_dir}. Set RAG_DATA_DIR to the folder with the PDFs."
+    candidates, token_budget = _context_settings(k, token_budget)
     try:
-        results = index.query(query, k=k)
+        results = index.query(query, k=candidates, mode=mode, region=region, where=where)
     except Exception as e:
         return f"RAG query failed: {e}"
-    if not results:
-        return "No relevant context found in AiRules."
-    lines: List[str] = []
-    for i, (doc, meta) in enumerate(results, 1):
-        src = meta.get("source", "unknown") if isinstance(meta, dict) else "unknown"
-        lines.append(f"[{i}] Source: {src}\n{doc.strip()[:1500]}")
-    return "\n\n".join(lines)
+    return _degraded_note() + _format_results(results, k, token_budget)
+
+
+@traced("tool", "rag_search")
+async def arag_search(
+    query: str,
+    k: int = 6,
+    mode: str | None = None,
+    region: str | None = None,
+    where: dict | None = None,
+    token_budget: int | None = None,
+    timeout: float | None = None,
+) -> str:
+    """Async ``rag_search`` that never blocks the event loop."""
+    not_ready = await asyncio.to_thread(_index_not_ready)
+    if not_ready:
+        return not_ready
+    try:
+        index = await run_blocking(_get_index)
+    except Exception as e:
+        return f"RAG unavailable: {e}"
+    if not index.data_dir.exists():
+        return f"No AiRules corpus found at {index.data_dir}. Set RAG_DATA_DIR to the folder with the PDFs."
+    candidates, token_budget = _context_settings(k, token_budget)
+    try:
+        results = await index.aquery(query, k=candidates, mode=mode, region=region, where=where, timeout=timeout)
+    except asyncio.TimeoutError:
+        return f"RAG query timed out after {query_timeout(timeout):g}s."
+    except Exception as e:
+        return f"RAG query failed: {e}"
+    return _degraded_note() + _format_results(results, k, token_budget)
+
+
+@traced("tool", "rag_search_batch")
+def rag_search_batch(
+    queries: List[str],
+    k: int = 6,
+    mode: str | None = None,
+    region: str | None = None,
+    where: dict | None = None,
+    token_budget: int | None = None,
+) -> str:
+    """Run several searches with one embedding request and one Chroma lookup.
+
+    Results are grouped per query and packed like ``rag_search`` (``token_budget``
+    applies to each query). A passage already returned for an earlier query is
+    listed only as a reference to its first occurrence.
+    """
+    queries = [q for q in (q.strip() for q in queries) if q]
+    if not queries:
+        return "No queries given."
+    not_ready = _index_not_ready()
+    if not_ready:
+        return not_ready
+    try:
+        index = _get_index()
+    except Exception as e:
+        return f"RAG unavailable: {e}"
+    if not index.data_dir.exists():
+        return f"No AiRules corpus found at {index.data_dir}. Set RAG_DATA_DIR to the folder with the PDFs."
+    candidates, token_budget = _context_settings(k, token_budget)
+    try:
+        batches = index.query_batch(queries, k=candidates, mode=mode, region=region, where=where)
+    except Exception as e:
+        return f"RAG query failed: {e}"
+    return _degraded_note() + _format_batch(queries, batches, k, token_budget)
+
+
+@traced("tool", "rag_search_batch")
+async def arag_search_batch(
+    queries: List[str],
+    k: int = 6,
+    mode: str | None = None,
+    region: str | None = None,
+    where: dict | None = None,
+    token_budget: int | None = None,
+    timeout: float | None = None,
+) -> str:
+    """Async ``rag_search_batch`` that never blocks the event loop."""
+    queries = [q for q in (q.strip() for q in queries) if q]
+    if not queries:
+        return "No queries given."
+    not_ready = await asyncio.to_thread(_index_not_ready)
+    if not_ready:
+        return not_ready
+    try:
+        index = await run_blocking(_get_index)
+    except Exception as e:
+        return f"RAG unavailable: {e}"
+    if not index.data_dir.exists():
+        return f"No AiRules corpus found at {index.data_dir}. Set RAG_DATA_DIR to the folder with the PDFs."
+    candidates, token_budget = _context_settings(k, token_budget)
+    try:
+        batches = await index.aquery_batch(
+            queries, k=candidates, mode=mode, region=region, where=where, timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        return f"RAG query timed out after {query_timeout(timeout):g}s."
+    except Exception as e:
+        return f"RAG query failed: {e}"
+    return _degraded_note() + _format_batch(queries, batches, k, token_budget)
 
 
 class RagSearchInput(BaseModel):
     query: str = Field(..., description="Search query for the AiRules knowledge base")
     k: int = Field(6, description="Number of results to retrieve")
+    mode: str | None = Field(
+        None,
+        description="Retrieval mode: 'hybrid' (default), 'lexical' for exact identifiers like 'Article 52', or 'vector'",
+    )
+    region: str | None = Field(
+        None,
+        description="Target region (e.g. 'EU', 'USA', 'Canada') to search only its documents plus global standards",
+    )
+    where: dict | None = Field(
+        None,
+        description=(
+            "Optional metadata filter in Chroma 'where' syntax over 'source' (PDF filename), 'jurisdiction', "
+            "'scope' ('global' or 'regional') and 'doc_type' ('regulation', 'guide', 'standard', 'framework'), "
+            "e.g. {\"doc_type\": \"regulation\"}; combined with region"
+        ),
+    )
+    token_budget: int | None = Field(
+        None,
+        description="Maximum tokens of context to return (default 1200)",
+    )
+
+
+class _RunTool(BaseTool):
+    """Base of the RAG tools: records their spans into the trace of the crew run using them.
+
+    CrewAI calls tools of ``async_execution`` tasks on threads that do not
+    inherit the run's context, so the crew passes ``tracer_source`` explicitly.
+    """
 
+    tracer_source: Callable[[], Any] | None = Field(default=None, exclude=True)
 
-class RagSearchTool(BaseTool):
+    def _tracer(self):
+        return self.tracer_source() if self.tracer_source is not None else None
+
+
+class RagSearchTool(_RunTool):
     name: str = "rag_search"
     description: str = (
         "Search AiRules PDFs and return the top-k contextual snippets with citations."
     )
     args_schema: type[BaseModel] = RagSearchInput
 
-    def _run(self, query: str, k: int = 6) -> str:  # type: ignore[override]
-        return rag_search(query=query, k=k)
-
-    async def _arun(self, query: str, k: int = 6) -> str:  # type: ignore[override]
-        return rag_search(query=query, k=k)
+    def _run(  # type: ignore[override]
+        self,
+        query: str,
+        k: int = 6,
+        mode: str | None = None,
+        region: str | None = None,
+        where: dict | None = None,
+        token_budget: int | None = None,
+    ) -> str:
+        with activate(self._tracer()):
+            return rag_search(query=query, k=k, mode=mode, region=region, where=where, token_budget=token_budget)
+
+    async def _arun(  # type: ignore[override]
+        self,
+        query: str,
+        k: int = 6,
+        mode: str | None = None,
+        region: str | None = None,
+        where: dict | None = None,
+        token_budget: int | None = None,
+    ) -> str:
+        with activate(self._tracer()):
+            return await arag_search(query=query, k=k, mode=mode, region=region, where=where, token_budget=token_budget)
+
+
+class RagBatchSearchInput(BaseModel):
+    queries: List[str] = Field(..., description="Related search queries for the AiRules knowledge base")
+    k: int = Field(6, description="Number of results to retrieve per query")
+    mode: str | None = Field(
+        None,
+        description="Retrieval mode: 'hybrid' (default), 'lexical' for exact identifiers like 'Article 52', or 'vector'",
+    )
+    region: str | None = Field(
+        None,
+        description="Target region (e.g. 'EU', 'USA', 'Canada') to search only its documents plus global standards",
+    )
+    where: dict | None = Field(
+        None,
+        description=(
+            "Optional metadata filter in Chroma 'where' syntax over 'source' (PDF filename), 'jurisdiction', "
+            "'scope' ('global' or 'regional') and 'doc_type' ('regulation', 'guide', 'standard', 'framework'), "
+            "e.g. {\"doc_type\": \"regulation\"}; combined with region"
+        ),
+    )
+    token_budget: int | None = Field(
+        None,
+        description="Maximum tokens of context to return per query (default 1200)",
+    )
 
 
+class RagBatchSearchTool(_RunTool):
+    name: str = "rag_search_batch"
+    description: str = (
+        "Search AiRules PDFs for several related queries at once and return grouped snippets with citations. "
+        "Prefer this over repeated rag_search calls when you need more than one lookup."
+    )
+    args_schema: type[BaseModel] = RagBatchSearchInput
+
+    def _run(  # type: ignore[override]
+        self,
+        queries: List[str],
+        k: int = 6,
+        mode: str | None = None,
+        region: str | None = None,
+        where: dict | None = None,
+        token_budget: int | None = None,
+    ) -> str:
+        with activate(self._tracer()):
+            return rag_search_batch(
+                queries=queries, k=k, mode=mode, region=region, where=where, token_budget=token_budget
+            )
+
+    async def _arun(  # type: ignore[override]
+        self,
+        queries: List[str],
+        k: int = 6,
+        mode: str | None = None,
+        region: str | None = None,
+        where: dict | None = None,
+        token_budget: int | None = None,
+    ) -> str:
+        with activate(self._tracer()):
+            return await arag_search_batch(
+                queries=queries, k=k, mode=mode, region=region, where=where, token_budget=token_budget
+            )
@@ -0,0 +1,53 @@
+import gzip
+import json
+import os
+from pathlib import Path
+from typing import Iterable, List
+
+
+class PageTextCache:
+    """Gzip-compressed per-page text of parsed PDFs, keyed by file hash and extractor version.
+
+    Re-chunking or re-embedding a document reads its pages from here instead of
+    running the PDF extractor again.
+    """
+
+    def __init__(self, cache_dir: Path, extractor_version: str):
+        self.cache_dir = cache_dir
+        self.extractor_version = extractor_version
+
+    def _path(self, digest: str) -> Path:
+        return self.cache_dir / f"{digest}.v{self.extractor_version}.json.gz"
+
+    def get(self, digest: str) -> List[str] | None:
+        path = self._path(digest)
+        if not path.exists():
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        pages = payload.get("pages")
+        return pages if isinstance(pages, list) else None
+
+    def put(self, digest: str, pages: List[str]) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(digest)
+        # Unique temp name because several extraction processes may write concurrently
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump({"extractor_version": self.extractor_version, "pages": pages}, f)
+        os.replace(tmp, path)
+
+    def prune(self, keep: Iterable[str]) -> int:
+        """Delete entries whose digest is not in ``keep`` or that were written by another extractor version."""
+        if not self.cache_dir.exists():
+            return 0
+        wanted = {self._path(digest).name for digest in keep}
+        removed = 0
+        for path in self.cache_dir.glob("*.json.gz"):
+            if path.name not in wanted:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
@@ -0,0 +1,313 @@
+import gzip
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterator, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None
+
+try:
+    from .jurisdiction import matches_where
+except Exception:  # Allows running as a script without package context
+    from jurisdiction import matches_where
+
+logger = logging.getLogger(__name__)
+
+VECTOR_BACKENDS = ("chroma", "numpy")
+NUMPY_DTYPES = ("float16", "int8")
+
+# (id, document, metadata)
+Row = Tuple[str, str, dict]
+
+
+class VectorStore:
+    """Chunk vectors, texts and metadata underneath ``RAGIndex``.
+
+    ``directory`` also holds the backend's manifest and BM25 index, so every
+    backend tracks its own indexing progress.
+    """
+
+    name = ""
+    directory: Path
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def ids(self, source: str) -> set:
+        """Chunk ids stored for ``source``."""
+        raise NotImplementedError
+
+    def records(self, include_embeddings: bool = False) -> Iterator[Tuple[str, str, dict, Sequence[float] | None]]:
+        """Yield every stored (id, document, metadata, embedding or None)."""
+        raise NotImplementedError
+
+    def add(
+        self, ids: List[str], documents: List[str], metadatas: List[dict], embeddings: Sequence[Sequence[float]]
+    ) -> None:
+        raise NotImplementedError
+
+    def delete_source(self, source: str) -> None:
+        raise NotImplementedError
+
+    def query(self, embeddings: Sequence[Sequence[float]], k: int, where: dict | None = None) -> List[List[Row]]:
+        """Top-``k`` rows by cosine similarity for each query embedding, best first."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def persist(self) -> None:
+        """Flush buffered writes; called after every indexed document."""
+
+
+class ChromaVectorStore(VectorStore):
+    """Chroma persistent collection with an HNSW cosine index."""
+
+    name = "chroma"
+    collection_name = "ai_rules"
+
+    def __init__(self, directory: Path, embedding_fn):
+        try:
+            import chromadb
+        except Exception as e:
+            raise RuntimeError("chromadb is not installed. Install it or set RAG_VECTOR_BACKEND=numpy.") from e
+        self.directory = directory
+        self.embedding_fn = embedding_fn
+        self.client = chromadb.PersistentClient(path=str(self.directory))
+        self.collection = self._open()
+
+    def _open(self):
+        return self.client.get_or_create_collection(
+            name=self.collection_name,
+            embedding_function=self.embedding_fn,
+            metadata={"hnsw:space": "cosine"}
+        )
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def ids(self, source: str) -> set:
+        existing = self.collection.get(where={"source": source}, include=[])  # type: ignore[arg-type]
+        return set(existing.get("ids") or []) if existing else set()
+
+    def records(self, include_embeddings: bool = False, page_size: int = 1000):
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        offset = 0
+        while True:
+            page = self.collection.get(include=include, limit=page_size, offset=offset)  # type: ignore[arg-type]
+            ids = page.get("ids") or []
+            if not ids:
+                return
+            embeddings = page.get("embeddings") if include_embeddings else None
+            for i, chunk_id in enumerate(ids):
+                yield (
+                    chunk_id,
+                    page["documents"][i],
+                    page["metadatas"][i],
+                    list(embeddings[i]) if embeddings is not None else None,
+                )
+            offset += len(ids)
+
+    def add(self, ids, documents, metadatas, embeddings) -> None:
+        self.collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def delete_source(self, source: str) -> None:
+        self.collection.delete(where={"source": source})
+
+    def query(self, embeddings, k, where=None) -> List[List[Row]]:
+        res = self.collection.query(query_embeddings=embeddings, n_results=k, where=where)
+        ids = res.get("ids") or []
+        docs = res.get("documents") or []
+        metas = res.get("metadatas") or []
+
+        def row(rows: list, i: int) -> list:
+            return rows[i] if i < len(rows) else []
+
+        return [list(zip(row(ids, i), row(docs, i), row(metas, i))) for i in range(len(embeddings))]
+
+    def clear(self) -> None:
+        self.client.delete_collection(self.collection_name)
+        self.collection = self._open()
+
+
+class NumpyVectorStore(VectorStore):
+    """Exact cosine search over a memory-mapped, quantized NumPy matrix.
+
+    Rows are L2-normalised and stored as float16, or as int8 scaled by 127, in
+    ``vectors.npy``; ``norms.npy`` holds each stored row's norm so scores stay
+    true cosines after quantization. Ids, documents and metadata live in the
+    ``records.json.gz`` sidecar. Writes are buffered in memory until
+    ``persist``, which rewrites the files and maps them read-only again.
+    """
+
+    name = "numpy"
+
+    def __init__(self, directory: Path, dtype: str = "float16", block_rows: int = 8192):
+        if np is None:
+            raise RuntimeError("numpy is not installed. Install it or set RAG_VECTOR_BACKEND=chroma.")
+        if dtype not in NUMPY_DTYPES:
+            raise ValueError(f"Unknown vector dtype '{dtype}', expected one of {', '.join(NUMPY_DTYPES)}")
+        self.directory = directory
+        self.dtype = dtype
+        self.block_rows = block_rows
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    def _reset(self) -> None:
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[dict] = []
+        self._matrix = None
+        self._norms = np.zeros(0, dtype=np.float32)
+
+    def _load(self) -> None:
+        self._reset()
+        if not self._path("records.json.gz").exists():
+            return
+        try:
+            with gzip.open(self._path("records.json.gz"), "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+            matrix = np.load(self._path("vectors.npy"), mmap_mode="r")
+            norms = np.load(self._path("norms.npy"))
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable vector store in %s: %s", self.directory, e)
+            return
+        if not (len(payload["ids"]) == matrix.shape[0] == norms.shape[0]):
+            logger.warning("Ignoring inconsistent vector store in %s", self.directory)
+            return
+        if matrix.shape[0] == 0:
+            # An emptied store persists a (0, 0) placeholder; keep it open to any dimension
+            return
+        self._ids, self._documents, self._metadatas = payload["ids"], payload["documents"], payload["metadatas"]
+        self._matrix, self._norms = matrix, norms
+
+    def _quantize(self, embeddings) -> Tuple["np.ndarray", "np.ndarray"]:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if self.dtype == "int8":
+            stored = np.clip(np.rint(vectors * 127), -127, 127).astype(np.int8)
+        else:
+            stored = vectors.astype(np.float16)
+        return stored, np.linalg.norm(stored.astype(np.float32), axis=1)
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def ids(self, source: str) -> set:
+        return {cid for cid, meta in zip(self._ids, self._metadatas) if meta.get("source") == source}
+
+    def records(self, include_embeddings: bool = False):
+        ids, documents, metadatas, matrix, norms = self._snapshot()
+        for i, chunk_id in enumerate(ids):
+            embedding = None
+            if include_embeddings:
+                embedding = (matrix[i].astype(np.float32) / max(float(norms[i]), 1e-12)).tolist()
+            yield chunk_id, documents[i], metadatas[i], embedding
+
+    def add(self, ids, documents, metadatas, embeddings) -> None:
+        if not ids:
+            return
+        stored, norms = self._quantize(embeddings)
+        with self._lock:
+            if self._matrix is not None and self._matrix.shape[1] != stored.shape[1]:
+                raise ValueError(
+                    f"Embedding dimension {stored.shape[1]} does not match the store's {self._matrix.shape[1]}"
+                )
+            self._matrix = stored if self._matrix is None else np.concatenate([self._matrix, stored])
+            self._norms = np.concatenate([self._norms, norms])
+            self._ids = self._ids + list(ids)
+            self._documents = self._documents + list(documents)
+            self._metadatas = self._metadatas + list(metadatas)
+            self._dirty = True
+
+    def delete_source(self, source: str) -> None:
+        with self._lock:
+            keep = [i for i, meta in enumerate(self._metadatas) if meta.get("source") != source]
+            if len(keep) == len(self._ids):
+                return
+            self._ids = [self._ids[i] for i in keep]
+            self._documents = [self._documents[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+            self._matrix = np.asarray(self._matrix[keep]) if keep else None
+            self._norms = self._norms[keep]
+            self._dirty = True
+        self.persist()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            self._dirty = True
+        self.persist()
+
+    def persist(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            matrix = self._matrix if self._matrix is not None else np.zeros((0, 0), dtype=self.dtype)
+            for name, array in (("vectors.npy", matrix), ("norms.npy", self._norms)):
+                tmp = self._path(name + ".tmp")
+                with open(tmp, "wb") as f:
+                    np.save(f, np.ascontiguousarray(array))
+                os.replace(tmp, self._path(name))
+            tmp = self._path("records.json.gz.tmp")
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump({"ids": self._ids, "documents": self._documents, "metadatas": self._metadatas}, f)
+            os.replace(tmp, self._path("records.json.gz"))
+            if self._matrix is not None:
+                self._matrix = np.load(self._path("vectors.npy"), mmap_mode="r")
+            self._dirty = False
+
+    def _snapshot(self):
+        with self._lock:
+            return self._ids, self._documents, self._metadatas, self._matrix, self._norms
+
+    def query(self, embeddings, k, where=None) -> List[List[Row]]:
+        ids, documents, metadatas, matrix, norms = self._snapshot()
+        if matrix is None or not ids or k <= 0:
+            return [[] for _ in embeddings]
+        queries = np.asarray(embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        rows = np.arange(len(ids))
+        if where:
+            rows = np.flatnonzero([matches_where(meta, where) for meta in metadatas])
+            if rows.size == 0:
+                return [[] for _ in embeddings]
+        # Score in blocks so a float16/int8 matrix is never upcast in full
+        scores = np.empty((rows.size, len(queries)), dtype=np.float32)
+        for start in range(0, rows.size, self.block_rows):
+            block = rows[start:start + self.block_rows]
+            vectors = (matrix[block] if where else matrix[start:start + self.block_rows]).astype(np.float32)
+            scores[start:start + len(block)] = vectors @ queries.T
+        scores /= np.maximum(norms[rows], 1e-12)[:, None]
+        top_k = min(k, rows.size)
+        results: List[List[Row]] = []
+        for column in scores.T:
+            top = np.argpartition(-column, top_k - 1)[:top_k]
+            top = top[np.argsort(-column[top])]
+            results.append([(ids[rows[i]], documents[rows[i]], metadatas[rows[i]]) for i in top])
+        return results
+
+
+def open_vector_store(backend: str, index_dir: Path, embedding_fn=None, dtype: str | None = None) -> VectorStore:
+    """Open the ``backend`` store of the index in ``index_dir``.
+
+    Chroma keeps its files directly in ``index_dir`` (where earlier versions put
+    them); the NumPy store lives in ``index_dir/numpy-<dtype>``.
+    """
+    backend = backend.lower()
+    if backend == "chroma":
+        return ChromaVectorStore(index_dir, embedding_fn)
+    if backend == "numpy":
+        dtype = (dtype or os.getenv("RAG_VECTOR_DTYPE", "float16")).lower()
+        return NumpyVectorStore(index_dir / f"numpy-{dtype}", dtype=dtype)
+    raise ValueError(f"Unknown vector backend '{backend}', expected one of {', '.join(VECTOR_BACKENDS)}")
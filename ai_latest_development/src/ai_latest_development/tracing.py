@@ -0,0 +1,329 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets in the Prometheus export
+BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Numeric span attributes that are also exported as counters
+COUNTED_ATTRS = ("tokens", "cache_hits", "retries")
+
+
+@dataclass
+class Span:
+    """One timed operation: an LLM call, an embedding request, a query, a tool run or a task."""
+
+    kind: str
+    name: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent: str | None = None
+    started_at: float = field(default_factory=time.time)
+    duration: float = 0.0
+    status: str = "ok"
+    error: str | None = None
+    thread: str = field(default_factory=lambda: threading.current_thread().name)
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def incr(self, key: str, amount: float = 1) -> None:
+        # Embedding batches retry on pool threads, so increments may race
+        with _incr_lock:
+            self.attrs[key] = self.attrs.get(key, 0) + amount
+
+
+_incr_lock = threading.Lock()
+
+
+class Tracer:
+    """Collects the spans of one run (a crew kickoff, a UI job or an index build)."""
+
+    def __init__(self, run_id: str | None = None, **attrs: Any):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.attrs = attrs
+        self.started_at = time.time()
+        # Id of the run's root span; task spans hang off it
+        self.root: str | None = None
+        self._started = time.perf_counter()
+        self._spans: List[Span] = []
+        self._tasks: Dict[str, Tuple[Span, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def begin_task(self, key: str, name: str, agent: str | None) -> None:
+        """Open the span of task ``key`` unless it is already running; called on its first LLM call."""
+        with self._lock:
+            if key not in self._tasks:
+                self._tasks[key] = (Span("task", name, parent=self.root, attrs={"agent": agent}), time.perf_counter())
+
+    def end_task(self, key: str) -> None:
+        with self._lock:
+            opened = self._tasks.pop(key, None)
+        if opened is not None:
+            span, started = opened
+            span.duration = time.perf_counter() - started
+            _finish(span, self)
+
+    def summary(self) -> Dict[str, Any]:
+        """Busy seconds, tokens, cache hits, retries and errors per span kind and per task.
+
+        Spans of one kind overlap when agents or embedding batches run in
+        parallel, so a kind's seconds can exceed the run's wall time.
+        """
+        spans = self.spans()
+        kinds: Dict[str, Dict[str, Any]] = {}
+        for span in spans:
+            row = kinds.setdefault(
+                span.kind,
+                {"kind": span.kind, "spans": 0, "seconds": 0.0, "errors": 0, **{a: 0 for a in COUNTED_ATTRS}},
+            )
+            row["spans"] += 1
+            row["seconds"] += span.duration
+            row["errors"] += span.status != "ok"
+            for attr in COUNTED_ATTRS:
+                if isinstance(span.attrs.get(attr), (int, float)):
+                    row[attr] += span.attrs[attr]
+        tasks = []
+        for span in spans:
+            if span.kind != "task":
+                continue
+            llm = [s for s in spans if s.kind == "llm" and s.attrs.get("task") == span.name]
+            tasks.append({
+                "task": span.name,
+                "agent": span.attrs.get("agent"),
+                "seconds": round(span.duration, 3),
+                "llm_calls": len(llm),
+                "llm_seconds": round(sum(s.duration for s in llm), 3),
+                "tokens": sum(s.attrs.get("tokens", 0) for s in llm),
+            })
+        for row in kinds.values():
+            row["seconds"] = round(row["seconds"], 3)
+        return {
+            "run_id": self.run_id,
+            "wall_seconds": round(time.perf_counter() - self._started, 3),
+            "kinds": sorted(kinds.values(), key=lambda r: -r["seconds"]),
+            "tasks": tasks,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "attrs": self.attrs,
+            "summary": self.summary(),
+            "spans": [asdict(span) for span in sorted(self.spans(), key=lambda s: s.started_at)],
+        }
+
+    def write(self, directory: Path) -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.run_id}.json"
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self.to_dict(), indent=2, default=str), encoding="utf-8")
+        os.replace(tmp, path)
+        return path
+
+
+class Metrics:
+    """Process-wide span aggregates rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], List[int]] = {}
+        self._sums: Dict[Tuple[str, str], float] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._counters: Dict[Tuple[str, str, str], float] = {}
+
+    def observe(self, span: Span) -> None:
+        key = (span.kind, span.name)
+        with self._lock:
+            buckets = self._buckets.setdefault(key, [0] * (len(BUCKETS) + 1))
+            for i, bound in enumerate(BUCKETS):
+                if span.duration <= bound:
+                    buckets[i] += 1
+            buckets[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + span.duration
+            if span.status != "ok":
+                self._errors[key] = self._errors.get(key, 0) + 1
+            for attr in COUNTED_ATTRS:
+                value = span.attrs.get(attr)
+                if isinstance(value, (int, float)) and value:
+                    self._counters[(attr,) + key] = self._counters.get((attr,) + key, 0) + value
+
+    def render(self) -> str:
+        def labels(kind: str, name: str, extra: str = "") -> str:
+            name = name.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+            return f'{{kind="{kind}",name="{name}"{extra}}}'
+
+        lines = [
+            "# HELP ai_crew_span_duration_seconds Duration of traced operations.",
+            "# TYPE ai_crew_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (kind, name), buckets in sorted(self._buckets.items()):
+                bounds = [f"{bound:g}" for bound in BUCKETS] + ["+Inf"]
+                for bound, count in zip(bounds, buckets):
+                    le = ',le="' + bound + '"'
+                    lines.append(f"ai_crew_span_duration_seconds_bucket{labels(kind, name, le)} {count}")
+                lines.append(f"ai_crew_span_duration_seconds_sum{labels(kind, name)} {self._sums[(kind, name)]:.6f}")
+                lines.append(f"ai_crew_span_duration_seconds_count{labels(kind, name)} {buckets[-1]}")
+            lines += ["# HELP ai_crew_span_errors_total Traced operations that raised.",
+                      "# TYPE ai_crew_span_errors_total counter"]
+            for (kind, name), count in sorted(self._errors.items()):
+                lines.append(f"ai_crew_span_errors_total{labels(kind, name)} {count}")
+            for attr in COUNTED_ATTRS:
+                lines += [f"# HELP ai_crew_{attr}_total Sum of the '{attr}' attribute of traced operations.",
+                          f"# TYPE ai_crew_{attr}_total counter"]
+                for (counter, kind, name), value in sorted(self._counters.items()):
+                    if counter == attr:
+                        lines.append(f"ai_crew_{attr}_total{labels(kind, name)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+metrics = Metrics()
+
+_tracer: contextvars.ContextVar[Optional[Tracer]] = contextvars.ContextVar("run_tracer", default=None)
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _finish(span: Span, tracer: Tracer | None) -> None:
+    metrics.observe(span)
+    if tracer is not None:
+        tracer.add(span)
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _tracer.get()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def incr(key: str, amount: float = 1) -> None:
+    """Add ``amount`` to attribute ``key`` of the innermost open span, if any."""
+    span = _current.get()
+    if span is not None:
+        span.incr(key, amount)
+
+
+@contextlib.contextmanager
+def span(kind: str, name: str, **attrs: Any) -> Iterator[Span]:
+    """Time the block as a span nested under the current one, or under the run's root span.
+
+    Every span feeds the process-wide ``metrics``; inside ``trace_run`` (or
+    ``activate``) it is also kept for that run's trace file. Work handed to other
+    threads without the caller's context only shows up in the metrics.
+    """
+    parent, tracer = _current.get(), _tracer.get()
+    parent_id = parent.id if parent else (tracer.root if tracer else None)
+    current = Span(kind, name, parent=parent_id, attrs=attrs)
+    token = _current.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status, current.error = "error", str(e)[:500]
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current.reset(token)
+        _finish(current, _tracer.get())
+
+
+@contextlib.contextmanager
+def activate(tracer: Tracer | None) -> Iterator[None]:
+    """Record the block's spans into ``tracer``.
+
+    For code that runs on threads which do not inherit the run's context, such
+    as CrewAI's ``async_execution`` task threads; the crew hands its tracer to
+    its LLM and tools explicitly. A no-op when ``tracer`` is None or already current.
+    """
+    if tracer is None or _tracer.get() is tracer:
+        yield
+        return
+    token = _tracer.set(tracer)
+    try:
+        yield
+    finally:
+        _tracer.reset(token)
+
+
+def traced(kind: str, name: str | None = None) -> Callable:
+    """Decorator running a sync or async function inside ``span(kind, name or function name)``."""
+
+    def decorate(fn: Callable) -> Callable:
+        label = name or fn.__name__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(kind, label):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(kind, label):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def trace_dir() -> Path | None:
+    """Where run traces and ``metrics.prom`` are written; ``None`` when ``TRACE=0``."""
+    if os.getenv("TRACE", "1") == "0":
+        return None
+    return Path(os.getenv("TRACE_DIR", "traces"))
+
+
+@contextlib.contextmanager
+def trace_run(kind: str, name: str, run_id: str | None = None, **attrs: Any) -> Iterator[Tracer]:
+    """Collect the spans of one run and export them when it ends.
+
+    The run itself is the root span. Afterwards ``<TRACE_DIR>/<run id>.json``
+    holds the run's spans and summary, and ``<TRACE_DIR>/metrics.prom`` the
+    process-wide metrics so far.
+    """
+    tracer = Tracer(run_id, **attrs)
+    token = _tracer.set(tracer)
+    try:
+        with span(kind, name, run_id=tracer.run_id, **attrs) as root:
+            tracer.root = root.id
+            yield tracer
+    finally:
+        _tracer.reset(token)
+        directory = trace_dir()
+        if directory is not None:
+            try:
+                path = tracer.write(directory)
+                metrics.write(directory / "metrics.prom")
+                logger.info("Trace written to %s", path)
+            except OSError as e:
+                logger.warning("Could not write trace for run %s: %s", tracer.run_id, e)
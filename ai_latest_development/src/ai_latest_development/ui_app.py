@@ -5,6 +5,9 @@ import time
 
 import streamlit as st
 
+# Must be the first Streamlit command of the script run
+st.set_page_config(page_title="AI Risk & Compliance Assessor", layout="wide")
+
 # Load .env early so downstream imports see GEMINI_API_KEY
 try:
     from dotenv import load_dotenv
@@ -15,11 +18,81 @@ except Exception:
 
 try:
     from .crew import AiLatestDevelopment
+    from .jobs import DONE, FAILED, JobManager
+    from .llm_client import get_llm_client
+    from .tools import start_index_warmup
 except Exception:
     from crew import AiLatestDevelopment
+    from jobs import DONE, FAILED, JobManager
+    from llm_client import get_llm_client
+    from tools import start_index_warmup
 
 
-st.set_page_config(page_title="AI Risk & Compliance Assessor", layout="wide")
+@st.cache_resource
+def _job_manager():
+    """Process-wide worker pool shared by all sessions, with the LLM client and RAG index opened once."""
+    get_llm_client()
+    if os.getenv("RAG_WARMUP", "1") != "0":
+        start_index_warmup()
+    return JobManager(AiLatestDevelopment)
+
+
+def _render_timing(job):
+    """Where the run's time went: busy seconds, tokens and cache hits per operation kind and per task."""
+    if job.trace is None:
+        return
+    summary = job.trace.summary()
+    with st.expander(f"⏱ Timing – {summary['wall_seconds']:.1f}s wall clock"):
+        if summary['kinds']:
+            st.table(summary['kinds'])
+        if summary['tasks']:
+            st.table(summary['tasks'])
+
+
+def _render_job(job):
+    title = job.inputs.get('topic', job.id)
+    if job.active:
+        elapsed = int(time.time() - (job.started_at or job.submitted_at))
+        st.info(f"**{title}** – {job.status} ({elapsed}s)")
+        snapshot = job.transcript.snapshot()
+        for agent, output in snapshot['finished']:
+            with st.expander(f"Completed: {agent}"):
+                st.markdown(output)
+        for agent, partial in snapshot['live'].items():
+            st.markdown(f"**{agent}** (live)\n\n{partial}")
+        if snapshot['steps']:
+            with st.expander(f"Agent steps ({len(snapshot['steps'])})"):
+                for step in snapshot['steps'][-20:]:
+                    st.write(step)
+        _render_timing(job)
+        return
+    if job.status == FAILED:
+        st.error(f"**{title}** – run failed: {job.error}")
+        _render_timing(job)
+        return
+    content = job.report or ''
+    # Display word count
+    word_count = len(content.split())
+    st.info(f"📊 Report generated: {word_count} words")
+
+    # Display the formatted report
+    with st.expander(f"📋 Generated Report – {title}", expanded=True):
+        st.markdown(content)
+
+    # Download button
+    st.download_button(
+        label="📥 Download Report (Markdown)",
+        data=content,
+        file_name=f"ai_risk_report_{title.strip().replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.md",
+        mime="text/markdown",
+        key=f"download-{job.id}",
+    )
+    _render_timing(job)
+
+
+manager = _job_manager()
+st.session_state.setdefault('job_ids', [])
+
 st.title("AI Risk & Compliance Assessor")
 st.caption("Enter your own scenario: use case, data use, and region – nothing is hard-coded.")
 
@@ -80,69 +153,28 @@ if submitted:
             'data_use': data_use.strip(),
             'scenario': scenario.strip(),
         }
-        # Persist for non-UI runs if needed
-        os.environ['REGION'] = region
-        os.environ['DATA_USE'] = data_use
-        os.environ['SCENARIO'] = scenario
-
-        run_started_at = time.time()
-        with st.spinner("Running multi-agent assessment... this can take a few minutes"):
-            try:
-                result = AiLatestDevelopment().crew().kickoff(inputs=inputs)
-            except Exception as e:
-                st.error(f"Run failed: {e}")
-                result = None
-
-    st.subheader("Output")
-    if result is not None:
-        # Prefer fresh report.md only if it was updated in this run
-        report_path = os.path.join(os.path.dirname(__file__), '..', '..', 'report.md')
-        report_path = os.path.normpath(report_path)
-        if os.path.exists(report_path):
-            try:
-                mtime = os.path.getmtime(report_path)
-            except Exception:
-                mtime = 0
-            if mtime >= run_started_at - 1:
-                with open(report_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                    # Display word count
-                    word_count = len(content.split())
-                    st.info(f"📊 Report generated: {word_count} words")
-                    
-                    # Display the formatted report
-                    st.markdown("### 📋 Generated Report")
-                    st.markdown(content)
-                    
-                    # Download button
-                    st.download_button(
-                        label="📥 Download Report (Markdown)",
-                        data=content,
-                        file_name=f"ai_risk_report_{topic.strip().replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.md",
-                        mime="text/markdown"
-                    )
-            else:
-                st.write("### Direct Output")
-                st.write(result)
-        else:
-            st.write("### Direct Output")
-            st.write(result)
-    else:
-        st.info("No output produced. Check logs and configuration.")
+        job_id = manager.submit(inputs)
+        st.session_state['job_ids'].insert(0, job_id)
+        st.success(f"Assessment queued (job {job_id}). Progress is shown below.")
+
+st.subheader("Output")
+jobs = manager.jobs(st.session_state['job_ids'])
+if not jobs:
+    st.info("No assessments yet. Submit the form to start one.")
+for job in jobs:
+    _render_job(job)
 
 
 # Advanced utilities
 with st.expander("Advanced"):
-    col1, col2 = st.columns(2)
-    with col1:
-        if st.button("Delete existing report.md"):
-            rp = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..', 'report.md'))
-            try:
-                if os.path.exists(rp):
-                    os.remove(rp)
-                    st.success("Deleted report.md")
-                else:
-                    st.info("No report.md found")
-            except Exception as e:
-                st.error(f"Could not delete report.md: {e}")
+    if st.button("Clear finished assessments"):
+        for job in jobs:
+            if job.status in (DONE, FAILED):
+                manager.forget(job.id)
+                st.session_state['job_ids'].remove(job.id)
+        st.rerun()
 
+# Poll while any of this session's jobs is still queued or running
+if any(job.active for job in jobs):
+    time.sleep(1)
+    st.rerun()